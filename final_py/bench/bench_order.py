@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark for the read order of fic.py (--order list|inode|extent).
+
+Builds a deliberately fragmented tree: many files are grown together in
+small rounds with a sync after each round, so their extents end up
+interleaved on disk. The list is shuffled, like a hand-written list file
+that has nothing to do with disk layout. Before every run the files are
+dropped from the page cache (POSIX_FADV_DONTNEED), so the reads really go
+to the disk.
+
+On a spinning disk the inode/extent orders turn random seeks into forward
+sweeps. On SSDs, tmpfs or a VM disk backed by host cache the difference
+is small, so run it on the disk you care about:
+
+    python bench/bench_order.py --dir /srv/archive/tmp
+    python bench/bench_order.py --files 200 --size-mb 2 --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import fic  # noqa: E402
+
+ORDERS = ("list", "inode", "extent")
+
+
+def build_fragmented(root: Path, files: int, size: int, round_size: int, rng: random.Random) -> List[Path]:
+    paths = [root / f"d{i % 16:02d}" / f"frag{i:05d}.bin" for i in range(files)]
+    for p in paths:
+        p.parent.mkdir(parents=True, exist_ok=True)
+    block = rng.randbytes(round_size)
+    handles = [p.open("wb") for p in paths]
+    try:
+        for _ in range(max(1, size // round_size)):
+            for f in handles:
+                f.write(block)
+                f.flush()
+            os.sync()  # allocate this round now, interleaved with the other files
+    finally:
+        for f in handles:
+            f.close()
+    rng.shuffle(paths)
+    return paths
+
+
+def drop_cache(paths: List[Path]) -> None:
+    for p in paths:
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def measure(paths: List[Path], order: str, jobs: int, repeat: int, total_bytes: int) -> Dict[str, float]:
+    entries = [fic.WatchEntry(str(p)) for p in paths]
+    opts = fic.HashOptions(order=order)
+    times = []
+    for _ in range(repeat):
+        drop_cache(paths)
+        start = time.perf_counter()
+        for _rec in fic.hash_paths(entries, jobs, opts=opts):
+            pass
+        times.append(time.perf_counter() - start)
+    secs = statistics.median(times)
+    return {
+        "seconds": round(secs, 3),
+        "mb_per_s": round(total_bytes / 1e6 / secs, 1),
+        "files_per_s": round(len(paths) / secs, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="Build the tree under this directory (default: system temp dir)")
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--size-mb", type=float, default=4, help="Size of every file")
+    parser.add_argument("--round-kb", type=int, default=64, help="Bytes added to each file per round")
+    parser.add_argument("--jobs", type=int, default=1, help="Hashing threads (1 shows seeking best)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    if not hasattr(os, "posix_fadvise"):
+        sys.exit("needs os.posix_fadvise to drop the page cache between runs")
+
+    rng = random.Random(args.seed)
+    results: Dict[str, object] = {"files": args.files, "size_mb": args.size_mb, "jobs": args.jobs}
+    with tempfile.TemporaryDirectory(prefix="fic_bench_", dir=args.dir) as tmp:
+        paths = build_fragmented(Path(tmp), args.files, int(args.size_mb * (1 << 20)), args.round_kb << 10, rng)
+        total = sum(p.stat().st_size for p in paths)
+        results["fiemap"] = fic.first_extent(str(paths[0])) is not None
+        results["orders"] = {o: measure(paths, o, args.jobs, args.repeat, total) for o in ORDERS}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.files} files x {args.size_mb} MiB, jobs={args.jobs}, FIEMAP {'yes' if results['fiemap'] else 'no'}")
+    print(f"{'order':<8} {'seconds':>9} {'MB/s':>9} {'files/s':>9}")
+    for order, r in results["orders"].items():  # type: ignore[union-attr]
+        print(f"{order:<8} {r['seconds']:>9} {r['mb_per_s']:>9} {r['files_per_s']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark for the integrity checkers.
+
+Builds synthetic trees in a temp directory and times `fic.py init`,
+`fic.py check` (stat cache), `fic.py check --paranoid` (full rehash) and the
+Bash `final/fic.sh init/check` on them. Every run is a separate process, so
+the numbers include interpreter startup like a cron job would see.
+
+Trees:
+    tiny   - many small files (100 B - 4 KiB)
+    huge   - a few big files
+    deep   - files spread over a deep directory chain
+    mixed  - log-distributed sizes from bytes to tens of MiB
+
+Output is JSON: files/s, MB/s, peak RSS (KiB) and per-phase times from
+`fic.py --timings` (list parsing, hashing, writing, loading, comparing).
+The scripts are copied into the temp directory so the repo's db/ and logs/
+are never touched. Works offline, needs only Python and (for fic.sh) bash
+with sha256sum.
+
+    python bench/bench_scan.py
+    python bench/bench_scan.py --scale 0.1 --trees tiny,mixed -o result.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+FINAL_PY = Path(__file__).resolve().parent.parent
+FIC_PY = FINAL_PY / "fic.py"
+FIC_SH = FINAL_PY.parent / "final" / "fic.sh"
+
+TREES = ("tiny", "huge", "deep", "mixed")
+
+
+def write_file(path: Path, size: int, rng: random.Random) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    block = rng.randbytes(min(size, 1 << 20)) if size else b""
+    with path.open("wb") as f:
+        left = size
+        while left > 0:
+            f.write(block[:left])
+            left -= len(block)
+
+
+def build_tree(kind: str, root: Path, scale: float, rng: random.Random) -> List[Path]:
+    """Create one synthetic tree and return its files in list order."""
+    files: List[Path] = []
+    if kind == "tiny":
+        for i in range(max(1, int(20000 * scale))):
+            files.append(root / f"d{i // 1000:03d}" / f"f{i:06d}.txt")
+            write_file(files[-1], rng.randint(100, 4096), rng)
+    elif kind == "huge":
+        for i in range(3):
+            files.append(root / f"huge{i}.bin")
+            write_file(files[-1], max(1 << 20, int((256 << 20) * scale)), rng)
+    elif kind == "deep":
+        d = root
+        for level in range(max(1, int(60 * scale))):
+            d = d / f"level{level:02d}"
+            for i in range(20):
+                files.append(d / f"f{i}.dat")
+                write_file(files[-1], rng.randint(512, 64 << 10), rng)
+    elif kind == "mixed":
+        for i in range(max(1, int(4000 * scale))):
+            size = int(2 ** rng.uniform(6, 25))  # 64 B .. 32 MiB, log-uniform
+            files.append(root / f"dir{i % 50:02d}" / f"file{i:05d}.bin")
+            write_file(files[-1], size, rng)
+    else:
+        raise ValueError(kind)
+    return files
+
+
+def run(cmd: List[str], cwd: Path, timeout: float) -> Dict[str, float]:
+    """Run one command, return wall time and peak RSS of that process."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = start + timeout
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.perf_counter() > deadline:
+            proc.kill()
+            os.wait4(proc.pid, 0)
+            raise TimeoutError(" ".join(cmd))
+        time.sleep(0.005)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        err = proc.stderr.read().decode(errors="replace") if proc.stderr else ""
+        raise RuntimeError(f"{' '.join(cmd)} failed ({proc.returncode}): {err.strip()}")
+    return {"seconds": round(wall, 4), "peak_rss_kib": usage.ru_maxrss}
+
+
+def rates(result: Dict, files: int, total_bytes: int) -> Dict:
+    secs = result["seconds"] or 1e-9
+    result["files_per_s"] = round(files / secs, 1)
+    result["mb_per_s"] = round(total_bytes / 1e6 / secs, 1)
+    return result
+
+
+def bench_python(work: Path, listfile: Path, files: int, total: int, jobs: Optional[int], timeout: float) -> Dict:
+    app = work / "py"
+    app.mkdir()
+    shutil.copy2(FIC_PY, app / "fic.py")
+    timings = app / "timings.json"
+    extra = ["--jobs", str(jobs)] if jobs else []
+
+    results = {}
+    steps = {
+        "init": ["init", str(listfile), *extra],
+        "check": ["check", str(listfile), "--full-every", "0", *extra],
+        "check_paranoid": ["check", str(listfile), "--paranoid", *extra],
+    }
+    for name, args in steps.items():
+        cmd = [sys.executable, str(app / "fic.py"), "--timings", str(timings), *args]
+        results[name] = rates(run(cmd, app, timeout), files, total)
+        results[name]["phases"] = json.loads(timings.read_text(encoding="utf-8"))
+    return results
+
+
+def bench_shell(work: Path, listfile: Path, files: int, total: int, timeout: float) -> Dict:
+    app = work / "sh"
+    app.mkdir()
+    shutil.copy2(FIC_SH, app / "fic.sh")
+    results = {}
+    for name in ("init", "check"):
+        cmd = ["bash", str(app / "fic.sh"), name, str(listfile)]
+        results[name] = rates(run(cmd, app, timeout), files, total)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trees", default=",".join(TREES), help=f"Comma separated subset of: {', '.join(TREES)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply file counts/sizes (default: 1.0)")
+    parser.add_argument("--jobs", type=int, help="Pass --jobs N to fic.py (default: its own default)")
+    parser.add_argument("--no-shell", action="store_true", help="Skip final/fic.sh")
+    parser.add_argument(
+        "--shell-max-files",
+        type=int,
+        default=2000,
+        help="Skip fic.sh on bigger trees, its check is quadratic (default: 2000)",
+    )
+    parser.add_argument("--timeout", type=float, default=3600, help="Per command timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report: Dict[str, Dict] = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "scale": args.scale,
+        "trees": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="fic_bench_") as tmp:
+        for kind in [t.strip() for t in args.trees.split(",") if t.strip()]:
+            if kind not in TREES:
+                parser.error(f"unknown tree: {kind}")
+            work = Path(tmp) / kind
+            start = time.perf_counter()
+            files = build_tree(kind, work / "tree", args.scale, rng)
+            listfile = work / "list.txt"
+            listfile.write_text("\n".join(map(str, files)) + "\n", encoding="utf-8")
+            total = sum(p.stat().st_size for p in files)
+            print(f"{kind}: {len(files)} files, {total / 1e6:.1f} MB, built in {time.perf_counter() - start:.1f}s",
+                  file=sys.stderr)
+
+            entry: Dict[str, object] = {"files": len(files), "bytes": total}
+            entry["fic.py"] = bench_python(work, listfile, len(files), total, args.jobs, args.timeout)
+            if args.no_shell:
+                pass
+            elif not shutil.which("bash") or not FIC_SH.exists():
+                entry["fic.sh"] = "skipped: bash or final/fic.sh not available"
+            elif len(files) > args.shell_max_files:
+                entry["fic.sh"] = f"skipped: more than {args.shell_max_files} files"
+            else:
+                entry["fic.sh"] = bench_shell(work, listfile, len(files), total, args.timeout)
+            report["trees"][kind] = entry  # type: ignore[index]
+            shutil.rmtree(work)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(out + "\n", encoding="utf-8")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Baseline load benchmark for the fic.py stores.
+
+Writes one synthetic baseline of N entries (no real files, random SHA-256
+digests and stat data) into each store, then, in a fresh process per store,
+times what a check does before hashing anything: opening the store and
+building the stat-cache lookup. It then times random lookups (half hits,
+half misses) and reports the peak RSS of that process and the size of the
+baseline on disk.
+
+    python bench/bench_store.py
+    python bench/bench_store.py --entries 5000000 --stores text,binary -o result.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+FINAL_PY = Path(__file__).resolve().parent.parent
+FIC_PY = FINAL_PY / "fic.py"
+
+STORES = ("text", "sorted", "binary", "sqlite")
+
+BUILD = """
+import os, random, sys, fic
+name, n = sys.argv[1], int(sys.argv[2])
+rng = random.Random(1)
+def records():
+    for i in range(n):
+        path = f"/srv/data/d{i // 1000:05d}/file{i:08d}.dat"
+        key = (rng.randrange(1 << 30), rng.randrange(1 << 60), rng.randrange(1 << 60), i + 1, 2049)
+        yield fic.Record(path, os.urandom(32).hex(), key)
+fic.DB_DIR.mkdir(exist_ok=True)
+store = fic.open_store(name, create=True)
+store.write("baseline", records())
+store.save_state({"store": name, "algos": ["sha256"]})
+store.close()
+"""
+
+PROBE = """
+import json, random, resource, sys, time
+start = time.perf_counter()
+import fic
+name, n, k = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+store = fic.open_store(name)
+lookup = store.baseline_lookup()
+load = time.perf_counter() - start
+rng = random.Random(2)
+keys = [f"/srv/data/d{i // 1000:05d}/file{i:08d}.dat" for i in (rng.randrange(n) for _ in range(k // 2))]
+keys += [f"/srv/other/x{i}" for i in range(k - len(keys))]
+start = time.perf_counter()
+hits = sum(lookup(p) is not None for p in keys)
+secs = time.perf_counter() - start
+assert hits == k // 2, hits
+print(json.dumps({"load_s": round(load, 3), "lookups_per_s": round(k / secs) if secs else 0,
+                  "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def disk_bytes(db: Path) -> int:
+    return sum(p.stat().st_size for p in db.iterdir() if p.is_file() and not p.name.startswith("."))
+
+
+def bench_store(name: str, work: Path, entries: int, lookups: int) -> Dict:
+    app = work / name
+    app.mkdir()
+    shutil.copy2(FIC_PY, app / "fic.py")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", BUILD, name, str(entries)], cwd=app, check=True)
+    result: Dict = {"write_s": round(time.perf_counter() - start, 3), "disk_bytes": disk_bytes(app / "db")}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, name, str(entries), str(lookups)],
+        cwd=app,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result.update(json.loads(out))
+    shutil.rmtree(app)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000, help="Baseline size (default: 1000000)")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Random lookups to time (default: 100000)")
+    parser.add_argument("--stores", default=",".join(STORES), help=f"Comma separated subset of: {', '.join(STORES)}")
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    names: List[str] = [s.strip() for s in args.stores.split(",") if s.strip()]
+    for name in names:
+        if name not in STORES:
+            parser.error(f"unknown store: {name}")
+
+    report: Dict = {"python": sys.version.split()[0], "entries": args.entries, "stores": {}}
+    with tempfile.TemporaryDirectory(prefix="fic_bench_") as tmp:
+        for name in names:
+            print(f"{name}: writing {args.entries} entries...", file=sys.stderr)
+            report["stores"][name] = bench_store(name, Path(tmp), args.entries, args.lookups)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(out + "\n", encoding="utf-8")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
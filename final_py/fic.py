@@ -2,11 +2,60 @@
 from __future__ import annotations
 
 import argparse
+import array
+import atexit
+import bisect
+import ctypes
+import ctypes.util
+import gzip
 import hashlib
+import heapq
+import itertools
+import json
+import mmap
 import os
+import queue
+import re
+import select
+import shutil
+import signal
+import socket
+import socketserver
+import sqlite3
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, Tuple
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, and open logs can't be renamed there anyway
+    fcntl = None  # type: ignore[assignment]
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 
 PROJECT_DIR = Path(__file__).resolve().parent
@@ -15,134 +64,2834 @@ LOG_DIR = PROJECT_DIR / "logs"
 DEFAULT_LIST = PROJECT_DIR / "critical_files.txt"
 BASELINE = DB_DIR / "baseline.sha256"
 LAST_SCAN = DB_DIR / "last_scan.sha256"
+BASELINE_META = DB_DIR / "baseline.meta"
+LAST_SCAN_META = DB_DIR / "last_scan.meta"
+STATE_FILE = DB_DIR / "state.json"
+SQLITE_DB = DB_DIR / "fic.sqlite"
+BASELINE_MERKLE = DB_DIR / "baseline.merkle"
+LAST_SCAN_MERKLE = DB_DIR / "last_scan.merkle"
 LOG_FILE = LOG_DIR / "fic.log"
+LOG_INDEX = LOG_DIR / "fic.log.index.json"
+DEFAULT_SOCKET = DB_DIR / "fic.sock"
+SCAN_JOURNAL = DB_DIR / "scan.journal"
+SCAN_CHECKPOINT = DB_DIR / "scan.checkpoint.json"
+
+# hashlib releases the GIL while hashing, so threads scale well on fast disks
+DEFAULT_JOBS = min(8, os.cpu_count() or 1)
+# Hashing I/O: files up to SMALL_FILE are read with one read() call, bigger
+# ones in CHUNK_SIZE pieces into a reused per-thread buffer, or with mmap
+CHUNK_SIZE = 1024 * 1024
+SMALL_FILE = 64 * 1024
+MMAP_MIN_SIZE = 16 * 1024 * 1024
+DEFAULT_ALGOS = ("sha256",)
+# Every Nth check ignores the stat cache and rehashes everything (0 = never)
+DEFAULT_FULL_EVERY = 24
+# --order inode/extent sorts this many list entries at a time by disk position
+LOCALITY_BATCH = 4096
+# Change events waiting for the --output writer before the scan is held back
+EVENT_QUEUE = 1000
+# --alert workers: events per batch, seconds to wait for a batch to fill,
+# send attempts per batch, events queued before new ones are dropped
+ALERT_BATCH = 100
+ALERT_BATCH_SECONDS = 1.0
+ALERT_RETRIES = 5
+ALERT_MAX_BACKOFF = 30.0
+ALERT_QUEUE = 100_000
+ALERT_DRAIN_SECONDS = 30.0
+ALERT_HTTP_TIMEOUT = 10.0
+SYSLOG_SOCKET = "/dev/log"
+SYSLOG_PRI = 4 * 8 + 4  # LOG_AUTH | LOG_WARNING
+# Inodes remembered for dedup; past this only hardlinked files (st_nlink > 1) are added
+DEDUP_MAX_ENTRIES = 1_000_000
+# A running check fsyncs its journal and checkpoint this often
+CHECKPOINT_EVERY = 10_000
+CHECKPOINT_SECONDS = 30.0
+
+# (st_size, st_mtime_ns, st_ctime_ns, st_ino, st_dev)
+StatKey = Tuple[int, int, int, int, int]
+
+
+class Record(NamedTuple):
+    path: str
+    digest: str  # hex digest or a marker like MISSING/ERROR
+    stat: Optional[StatKey] = None
+    cached: bool = False  # digest reused from the baseline, file not read
+
+
+class HashOptions(NamedTuple):
+    mmap: bool = False  # hash files >= MMAP_MIN_SIZE through mmap instead of read()
+    # hashlib algorithms, all fed from the same read; the digests are joined with ":"
+    algos: Tuple[str, ...] = DEFAULT_ALGOS
+    budget: Optional["IOBudget"] = None  # --max-mbps/--max-iops throttle shared by all threads
+    fadvise: bool = False  # read-ahead hint before, drop the file's pages from the cache after
+    dedup: Optional["InodeDedup"] = None  # hash every (st_dev, st_ino) once per run
+    order: str = "list"  # read order: list, inode or extent (output is always in list order)
+    timeout: float = 0  # seconds per file before it is given up as TIMEOUT (0 = wait forever)
+
+
+# Written instead of a digest when a file can't be hashed
+MARKERS = ("MISSING", "ERROR", "TIMEOUT")
+
+
+class Change(NamedTuple):
+    kind: str  # MODIFIED, MISSING, ERROR, TIMEOUT, NEW or UNSCANNED
+    path: str
+    old: Optional[str]  # baseline hash/marker
+    new: Optional[str]  # scan hash/marker
+
+
+CHANGE_MESSAGES = {
+    "UNSCANNED": "MISSING (not scanned)",
+    "MISSING": "MISSING",
+    "ERROR": "ERROR (could not hash)",
+    "TIMEOUT": "TIMEOUT (hashing took too long, hung filesystem?)",
+    "MODIFIED": "MODIFIED",
+    "NEW": "NEW (in list now, not in baseline)",
+}
+
+# path -> (baseline digest, baseline stat or None), or None if not in the baseline
+Lookup = Callable[[str], Optional[Tuple[str, Optional[StatKey]]]]
+
+
+# Log rotation defaults: 10 MiB or 7 days, whichever comes first
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_MAX_AGE = 7 * 24 * 3600
+# Lines per gzip member in rotated segments (the unit a log query seeks to)
+LOG_BLOCK_LINES = 1000
+
+
+class PhaseTimer:
+    """Wall time per phase (list, hash, write, compare...), off unless --timings is given.
+
+    Phases can nest; time spent in an inner phase is only counted there.
+    Only use it from the main thread.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.totals: Dict[str, float] = {}
+        self._stack: List[List[Any]] = []  # [name, time spent in children]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        self._stack.append([name, 0.0])
+        try:
+            yield
+        finally:
+            _, children = self._stack.pop()
+            elapsed = time.perf_counter() - start
+            self.totals[name] = self.totals.get(name, 0.0) + elapsed - children
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Count the time spent producing each item of `iterable` as `name`."""
+        if not self.enabled:
+            yield from iterable
+            return
+        it = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def dump(self, out_file: Path) -> None:
+        data = {name: round(seconds, 6) for name, seconds in sorted(self.totals.items())}
+        out_file.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+
+
+TIMER = PhaseTimer()
 
 
 def ts() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def log(message: str) -> None:
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
-    line = f"[{ts()}] {message}"
-    with LOG_FILE.open("a", encoding="utf-8") as f:
-        f.write(line + "\n")
-    print(line)
+class Logger:
+    """Appends to logs/fic.log through one buffered handle.
+
+    Lines are flushed every FLUSH_LINES lines or FLUSH_SECONDS, on flush() and
+    at exit, instead of an open/append/close per line. Flushes hold a shared
+    lock on logs/fic.log.lock and reopen the log if another process rotated
+    it meanwhile, so a long-running `serve`/`watch` never writes into a
+    segment that is being compressed. The default "text"
+    format is the classic "[ts] message" line; "json" writes one JSON object
+    per line (ts, level, msg and any extra fields such as event/path) for SIEMs.
+    The console always gets the text line.
+    """
+
+    FLUSH_LINES = 1000
+    FLUSH_SECONDS = 1.0
+
+    def __init__(self, path: Path = LOG_FILE, fmt: str = "text") -> None:
+        self.path = path
+        self.fmt = fmt
+        # Rotation: 0 turns a limit off
+        self.max_bytes = DEFAULT_LOG_MAX_BYTES
+        self.max_age = DEFAULT_LOG_MAX_AGE
+        self._first_ts: Optional[str] = None
+        self._f: Optional[TextIO] = None
+        self._buf: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def echo(self, line: str) -> None:
+        """Console output: stdout, or the client of this thread's `serve` request."""
+        fn = getattr(self._local, "echo", None)
+        (fn or print)(line)
+
+    @contextmanager
+    def echo_to(self, fn: Callable[[str], None]) -> Iterator[None]:
+        self._local.echo = fn
+        try:
+            yield
+        finally:
+            self._local.echo = None
+
+    def write(self, message: str, level: str = "info", **fields: Any) -> None:
+        line = f"[{ts()}] {message}"
+        if self.fmt == "json":
+            record = {"ts": datetime.now().astimezone().isoformat(timespec="seconds"), "level": level, "msg": message}
+            record.update(fields)
+            out = json.dumps(record, ensure_ascii=False)
+        else:
+            out = line
+        with self._lock:
+            self._buf.append(out + "\n")
+            if len(self._buf) >= self.FLUSH_LINES or time.monotonic() - self._last_flush >= self.FLUSH_SECONDS:
+                self._flush_locked()
+        self.echo(line)
+
+    def _open_locked(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._first_ts = first_log_ts(self.path)
+        if self._rotation_due(self.path.stat().st_size if self.path.exists() else 0):
+            rotate_log(self.path)
+            self._first_ts = None
+        self._f = self.path.open("a", encoding="utf-8", buffering=1024 * 1024)
+
+    def _stale(self) -> bool:
+        """True if logs/fic.log is no longer the file our handle writes to (rotated elsewhere)."""
+        assert self._f is not None
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._f.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rotation_due(self, size: int) -> bool:
+        if size == 0:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        if self.max_age and self._first_ts:
+            first = datetime.strptime(self._first_ts, "%Y-%m-%d %H:%M:%S")
+            return (datetime.now() - first).total_seconds() >= self.max_age
+        return False
+
+    def _flush_locked(self) -> None:
+        if self._buf:
+            if self._f is None:
+                self._open_locked()
+            assert self._f is not None
+            with log_lock(self.path, shared=True):
+                if self._stale():
+                    self._f.close()
+                    self._f = self.path.open("a", encoding="utf-8", buffering=1024 * 1024)
+                    self._first_ts = first_log_ts(self.path)
+                if self._first_ts is None:
+                    self._first_ts = ts()
+                self._f.write("".join(self._buf))
+                self._f.flush()
+            self._buf.clear()
+            if self._rotation_due(self._f.tell()):
+                self._f.close()
+                self._f = None
+                rotate_log(self.path)
+                self._first_ts = None
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+        sys.stdout.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+def line_ts(line: str) -> Optional[str]:
+    """Timestamp of a log line ("YYYY-mm-dd HH:MM:SS", local time), text or JSON format."""
+    if line.startswith("["):
+        return line[1:20]
+    if line.startswith('{"ts": "'):
+        return line[8:27].replace("T", " ")
+    return None
+
+
+def first_log_ts(path: Path) -> Optional[str]:
+    try:
+        with path.open("r", encoding="utf-8", errors="replace") as f:
+            return line_ts(f.readline())
+    except FileNotFoundError:
+        return None
+
+
+def load_log_index() -> List[dict]:
+    try:
+        return json.loads(LOG_INDEX.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+@contextmanager
+def log_lock(path: Path, shared: bool) -> Iterator[None]:
+    """flock on logs/fic.log.lock: shared while appending, exclusive while rotating."""
+    if fcntl is None:
+        yield
+        return
+    with path.with_name(path.name + ".lock").open("a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+
+
+def rotate_log(path: Path) -> None:
+    """Move the active log into a gzip segment and add it to the segment index.
+
+    The segment is a chain of gzip members of LOG_BLOCK_LINES lines each, which
+    is still a normal .gz file for zcat/zgrep. The index keeps the first
+    timestamp and compressed offset of every member, so a query can seek
+    straight to the block it needs instead of decompressing the whole file.
+    """
+    rotating = path.with_name(f"{path.name}.rotating-{os.getpid()}")
+    # No other process is mid-append while we hold the lock, and each one
+    # reopens the new file on its next flush, so nothing lands in `rotating` late
+    with log_lock(path, shared=False):
+        try:
+            path.replace(rotating)  # new writers start a fresh file right away
+        except FileNotFoundError:
+            return
+
+    first = first_log_ts(rotating) or ts()
+    stem = f"{path.name}.{first.replace('-', '').replace(':', '').replace(' ', '-')}"
+    n = 1
+    while True:
+        segment = path.with_name(f"{stem}.gz" if n == 1 else f"{stem}.{n}.gz")
+        try:
+            dst = segment.open("xb")  # claims the name, also against a concurrent rotation
+            break
+        except FileExistsError:
+            n += 1
+
+    blocks: List[Tuple[str, int]] = []
+    last = first
+    lines = 0
+    with rotating.open("r", encoding="utf-8", errors="replace") as src, dst:
+        chunk: List[str] = []
+
+        def write_block() -> None:
+            blocks.append((line_ts(chunk[0]) or last, dst.tell()))
+            dst.write(gzip.compress("".join(chunk).encode("utf-8")))
+
+        for line in src:
+            chunk.append(line)
+            lines += 1
+            last = line_ts(line) or last
+            if len(chunk) >= LOG_BLOCK_LINES:
+                write_block()
+                chunk = []
+        if chunk:
+            write_block()
+
+    # Read-modify-write of the index, so one rotation at a time
+    with log_lock(path, shared=False):
+        index = load_log_index()
+        index.append({"file": segment.name, "first": first, "last": last, "lines": lines, "blocks": blocks})
+        index.sort(key=lambda seg: seg["first"])
+        tmp = LOG_INDEX.with_name(f"{LOG_INDEX.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(index) + "\n", encoding="utf-8")
+        tmp.replace(LOG_INDEX)
+    rotating.unlink()
+
+
+LOGGER = Logger()
+atexit.register(LOGGER.close)
+
+
+def log(message: str, level: str = "info", **fields: Any) -> None:
+    LOGGER.write(message, level, **fields)
+
+
+def die(message: str, code: int = 1) -> None:
+    log(f"ERROR: {message}", level="error")
+    raise SystemExit(code)
+
+
+class FicError(Exception):
+    """Raised by the library API and shared helpers; the CLI turns it into die()."""
+
+
+def ensure_default_list() -> None:
+    if DEFAULT_LIST.exists():
+        return
+
+    DEFAULT_LIST.write_text(
+        "\n".join(
+            [
+                "# One file per line.",
+                "# Lines starting with # are comments (ignored).",
+                "# Directories (/etc/) and globs (/usr/bin/*, /opt/app/**/*.py) are expanded.",
+                "# Lines starting with ! exclude paths (!*.pyc, !/var/cache/**).",
+                "# This default list is project-local, so it works on Windows/Linux.",
+                "# You can add absolute paths (or relative ones if you prefer).",
+                "",
+                "# This script file:",
+                str(PROJECT_DIR / "fic.py"),
+                "",
+                "# Optional: track this list file too:",
+                str(DEFAULT_LIST),
+                "",
+            ]
+        ),
+        encoding="utf-8",
+    )
+
+    log(f"Created default list: {DEFAULT_LIST}")
+    log("Edit it if needed, then run: python fic.py init")
+
+
+def iter_list_paths(listfile: Path) -> Iterable[str]:
+    """Read paths from the list file (skip empty lines and comments)."""
+    try:
+        text = listfile.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        raise FicError(f"List file not found: {listfile}") from None
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        # Support ~/ at the start (also for !~/ excludes)
+        neg = "!" if line.startswith("!") else ""
+        if line[len(neg):].startswith("~/"):
+            line = neg + str(Path.home() / line[len(neg) + 2:])
+        yield line
+
+
+class WatchEntry(NamedTuple):
+    path: str
+    st: Optional[os.stat_result] = None  # stat data from the directory walk, if any
+
+
+GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a path glob to a regex.
+
+    `*` and `?` stay inside one path component, `**` spans directories.
+    Patterns without a slash match the file name anywhere (like .gitignore).
+    """
+    pattern = to_slash(pattern)
+    out = "" if "/" in pattern.rstrip("/") else "(?:.*/)?"
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out += ".*"
+            i += 2
+            continue
+        if c == "*":
+            out += "[^/]*"
+        elif c == "?":
+            out += "[^/]"
+        elif c == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out += "[" + body.replace("\\", "\\\\") + "]"
+            i = end
+        else:
+            out += re.escape(c)
+        i += 1
+    return out
+
+
+def to_slash(path: str) -> str:
+    return path.replace(os.sep, "/") if os.sep != "/" else path
+
+
+def compile_excludes(patterns: Iterable[str]) -> Callable[[str], bool]:
+    """Compile all exclude globs into one regex; returns a `path -> excluded?` test."""
+    return compile_regexes(glob_to_regex(p) for p in patterns)
+
+
+def compile_regexes(regexes: Iterable[str]) -> Callable[[str], bool]:
+    joined = "|".join(f"(?:{r})" for r in regexes)
+    if not joined:
+        return lambda path: False
+    matcher = re.compile(joined)
+    return lambda path: matcher.fullmatch(to_slash(path)) is not None
+
+
+_lists: Dict[Path, tuple] = {}
+
+
+def read_list(listfile: Path) -> Tuple[List[str], Callable[[str], bool]]:
+    """Split the list file into include lines and a compiled exclude test.
+
+    The result is kept until the file's mtime or size changes, so `serve`
+    does not parse and compile the list again for every check.
+    """
+    try:
+        st = listfile.stat()
+        key: Optional[tuple] = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    hit = _lists.get(listfile)
+    if key is not None and hit is not None and hit[0] == key:
+        return hit[1]
+    lines = list(iter_list_paths(listfile))
+    excluded = compile_excludes(line[1:] for line in lines if line.startswith("!"))
+    result = [line for line in lines if not line.startswith("!")], excluded
+    _lists[listfile] = (key, result)
+    return result
+
+
+def is_dir_entry(line: str) -> bool:
+    # Stats lines without a trailing "/" in the calling thread, outside any --timeout
+    return not GLOB_CHARS.search(line) and (line.endswith(("/", os.sep)) or os.path.isdir(line))
+
+
+def is_utf8(path: str) -> bool:
+    """False for names that os.scandir/fsdecode returned with surrogate escapes."""
+    try:
+        path.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def warn_not_utf8(path: str) -> None:
+    log(f"WARNING: skipping {os.fsencode(path)!r}: name is not valid UTF-8", level="warning")
+
+
+def dir_entry_top(line: str) -> str:
+    return line.rstrip("/" + os.sep) or line[:1]
+
+
+def compile_list_matcher(listfile: Path) -> Callable[[str], bool]:
+    """Return a `path -> watched?` test equivalent to expanding the list file."""
+    includes, excluded = read_list(listfile)
+    regexes = []
+    for line in includes:
+        if GLOB_CHARS.search(line):
+            regexes.append(glob_to_regex(line))
+        elif is_dir_entry(line):
+            regexes.append(re.escape(to_slash(dir_entry_top(line)).rstrip("/")) + "/.*")
+        else:
+            regexes.append(re.escape(to_slash(line)))
+    included = compile_regexes(regexes)
+    return lambda path: included(path) and not excluded(path)
+
+
+def scan_tree(
+    top: str,
+    depth: int,
+    excluded: Callable[[str], bool],
+    match: Optional[re.Pattern] = None,
+) -> Iterator[WatchEntry]:
+    """Walk `top` with os.scandir, yielding regular files in sorted name order.
+
+    `depth` is how many directory levels below `top` may be entered (-1 = no limit).
+    The stat result of each DirEntry is passed on, so files are not stat'ed twice.
+    Symlinked directories are not followed. Names that are not valid UTF-8
+    cannot be stored and are skipped with a warning.
+    """
+    try:
+        with os.scandir(top or ".") as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return
+
+    for e in entries:
+        path = os.path.join(top, e.name) if top else e.name
+        if not is_utf8(e.name):
+            warn_not_utf8(path)
+            continue
+        try:
+            if e.is_dir(follow_symlinks=False):
+                if depth != 0 and not excluded(path + "/"):
+                    yield from scan_tree(path, depth - 1, excluded, match)
+            elif e.is_file():
+                if excluded(path) or (match is not None and not match.fullmatch(to_slash(path))):
+                    continue
+                yield WatchEntry(path, e.stat())
+        except OSError:
+            continue
+
+
+def walk_dirs(top: str, depth: int, excluded: Callable[[str], bool]) -> Iterator[str]:
+    """`top` and the directories scan_tree(top, depth, excluded) would enter below it."""
+    yield top or "."
+    if depth == 0:
+        return
+    try:
+        with os.scandir(top or ".") as it:
+            names = sorted(e.name for e in it if e.is_dir(follow_symlinks=False))
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(top, name) if top else name
+        if is_utf8(name) and not excluded(path + "/"):
+            yield from walk_dirs(path, depth - 1, excluded)
+
+
+def glob_top(pattern: str) -> Tuple[str, int]:
+    """The literal leading directories of a glob and how deep below them it can match."""
+    parts = to_slash(pattern).split("/")
+    n = next(i for i, part in enumerate(parts) if GLOB_CHARS.search(part))
+    top = "/".join(parts[:n]) or ("/" if pattern.startswith(("/", os.sep)) else "")
+    rest = parts[n:]
+    depth = -1 if any("**" in part for part in rest) else len(rest) - 1
+    if os.sep != "/":
+        top = top.replace("/", os.sep)
+    return top, depth
+
+
+def expand_glob(pattern: str, excluded: Callable[[str], bool]) -> Iterator[WatchEntry]:
+    """Expand a glob entry by walking only below its literal leading directories."""
+    top, depth = glob_top(pattern)
+    match = re.compile(glob_to_regex(pattern))
+    yield from scan_tree(top, depth, excluded, match)
+
+
+def iter_watch_entries(listfile: Path) -> Iterator[WatchEntry]:
+    """Expand the list file into the files to hash, streaming.
+
+    Plain lines are single files, directories are walked recursively, globs
+    are expanded and `!pattern` lines exclude paths from everything else.
+    """
+    includes, excluded = read_list(listfile)
+
+    for line in includes:
+        if GLOB_CHARS.search(line):
+            yield from expand_glob(line, excluded)
+        elif is_dir_entry(line):
+            top = dir_entry_top(line)
+            if not excluded(top + "/"):
+                yield from scan_tree(top, -1, excluded)
+        elif not excluded(line):
+            yield WatchEntry(line)
+
+
+class IOBudget:
+    """Token buckets for read bandwidth and read calls, shared by all hashing threads.
+
+    A read is charged after it happened: the bucket may go into debt and the
+    thread sleeps until the debt is paid back. The buckets hold at most one
+    second of budget, so an idle phase (stat cache hits) can't be saved up
+    for a burst. `waited` is the wall time during which at least one thread
+    was held back, i.e. how much the budget stretched the scan.
+    """
+
+    def __init__(self, max_mbps: float = 0, max_iops: float = 0) -> None:
+        self.rates = (max_mbps * 1e6, float(max_iops))  # bytes/s, reads/s; 0 = unlimited
+        self.tokens = list(self.rates)
+        self.last = self.started = time.monotonic()
+        self.bytes = self.reads = 0
+        self.waited = 0.0
+        self._sleeping = 0
+        self._sleep_start = 0.0
+        self._lock = threading.Lock()
+
+    def take(self, nbytes: int, reads: int = 1) -> None:
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self.last = now - self.last, now
+            self.bytes += nbytes
+            self.reads += reads
+            wait = 0.0
+            for i, (rate, amount) in enumerate(zip(self.rates, (nbytes, reads))):
+                if rate:
+                    self.tokens[i] = min(rate, self.tokens[i] + rate * elapsed) - amount
+                    wait = max(wait, -self.tokens[i] / rate)
+            if wait <= 0:
+                return
+            if not self._sleeping:
+                self._sleep_start = now
+            self._sleeping += 1
+        time.sleep(wait)
+        with self._lock:
+            self._sleeping -= 1
+            if not self._sleeping:
+                self.waited += time.monotonic() - self._sleep_start
+
+    def summary(self) -> str:
+        total = time.monotonic() - self.started
+        pct = 100 * self.waited / total if total else 0.0
+        return (
+            f"I/O budget: read {self.bytes / 1e6:.1f} MB in {self.reads} reads, "
+            f"throttled {self.waited:.1f}s of {total:.1f}s ({pct:.0f}%)"
+        )
+
+
+_buffers = threading.local()
+
+
+def read_buffer() -> memoryview:
+    """One CHUNK_SIZE buffer per thread, reused for every file it hashes."""
+    buf = getattr(_buffers, "buf", None)
+    if buf is None:
+        buf = _buffers.buf = memoryview(bytearray(CHUNK_SIZE))
+    return buf
+
+
+def new_hasher(algo: str):
+    # The named constructors (hashlib.sha256 etc.) are faster than hashlib.new()
+    ctor = getattr(hashlib, algo, None)
+    return ctor() if callable(ctor) else hashlib.new(algo)
+
+
+def parse_algos(text: str) -> Tuple[str, ...]:
+    """Parse "sha256,blake2b" into a tuple of checked hashlib algorithm names."""
+    algos = tuple(a.strip().lower() for a in text.split(",") if a.strip())
+    if not algos:
+        raise ValueError("no algorithm given")
+    for algo in algos:
+        try:
+            h = hashlib.new(algo)
+        except ValueError:
+            raise ValueError(f"unknown hash algorithm: {algo}") from None
+        if h.digest_size == 0:
+            raise ValueError(f"variable-length algorithms are not supported: {algo}")
+    if len(set(algos)) != len(algos):
+        raise ValueError("algorithm listed twice")
+    return algos
+
+
+def join_digests(parts: List[str]) -> str:
+    return parts[0] if parts[0] in MARKERS else ":".join(parts)
+
+
+def split_digest(digest: str, n: int) -> List[str]:
+    return [digest] * n if digest in MARKERS else digest.split(":")
+
+
+def file_digest(path: Path, size: Optional[int] = None, opts: HashOptions = HashOptions()) -> str:
+    """Return the hex digest(s) of a file for every algorithm in opts.algos.
+
+    The file is read once and each chunk goes to all hashers. No new bytes
+    object is made per chunk: small files take a single read(), bigger ones
+    are read with readinto() into the thread's reused buffer (or hashed
+    straight from an mmap if opts.mmap is set).
+    `size` is only a hint, files that grow or shrink meanwhile are still hashed fully.
+    """
+    hashers = [new_hasher(a) for a in opts.algos]
+    budget = opts.budget
+    with open(path, "rb", buffering=0) as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        if opts.fadvise:
+            fadvise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+
+        try:
+            if size <= SMALL_FILE:
+                data = f.read(size + 1)  # +1 notices a file that grew since stat
+                if budget:
+                    budget.take(len(data))
+                for h in hashers:
+                    h.update(data)
+                if len(data) == size:
+                    return join_digests([h.hexdigest() for h in hashers])
+            elif opts.mmap and size >= MMAP_MIN_SIZE:
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                        if budget:
+                            # Hash in CHUNK_SIZE slices so the budget can pace the page faults
+                            with memoryview(m) as view:
+                                for pos in range(0, len(m), CHUNK_SIZE):
+                                    chunk = view[pos:pos + CHUNK_SIZE]
+                                    for h in hashers:
+                                        h.update(chunk)
+                                    budget.take(len(chunk))
+                                    chunk.release()
+                        else:
+                            for h in hashers:
+                                h.update(m)
+                        f.seek(len(m))
+                except (OSError, ValueError):
+                    # Some filesystems can't mmap, fall back to read()
+                    hashers = [new_hasher(a) for a in opts.algos]
+                    f.seek(0)
+
+            buf = read_buffer()
+            while True:
+                n = f.readinto(buf)
+                if budget:
+                    budget.take(n or 0)
+                if not n:
+                    break
+                chunk = buf[:n]
+                for h in hashers:
+                    h.update(chunk)
+        finally:
+            if opts.fadvise:
+                fadvise(f.fileno(), "POSIX_FADV_DONTNEED")
+    return join_digests([h.hexdigest() for h in hashers])
+
+
+def fadvise(fd: int, advice: str) -> None:
+    """posix_fadvise() where the platform has it (not on Windows/macOS), otherwise nothing."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+        except OSError:
+            pass
+
+
+def sha256_of_file(path: Path, size: Optional[int] = None, opts: HashOptions = HashOptions()) -> str:
+    """Return SHA-256 hex digest for the given file."""
+    return file_digest(path, size, opts._replace(algos=("sha256",)))
+
+
+def stat_key(st: os.stat_result) -> StatKey:
+    return (st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino, st.st_dev)
+
+
+class InodeDedup:
+    """Hash each inode once per run and hand its digest to every path that reaches it.
+
+    Hardlinks, bind mounts, overlapping globs and duplicated list lines all
+    end up at the same (st_dev, st_ino). A digest is only shared while
+    size/mtime/ctime match too, so a file changed in between is read again.
+    When another thread is already hashing an inode, the caller waits for
+    that result instead of reading the file a second time.
+    """
+
+    def __init__(self, max_entries: int = DEDUP_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.avoided = 0
+        self.avoided_bytes = 0
+        self._done: Dict[Tuple[int, int], Tuple[StatKey, str]] = {}
+        self._running: Dict[Tuple[int, int], Tuple[StatKey, threading.Event]] = {}
+        self._lock = threading.Lock()
+
+    def _hit(self, inode: Tuple[int, int], key: StatKey) -> Optional[str]:
+        """Called with the lock held."""
+        hit = self._done.get(inode)
+        if hit is None or hit[0] != key:
+            return None
+        self.avoided += 1
+        self.avoided_bytes += key[0]
+        return hit[1]
+
+    def remember(self, key: StatKey, nlink: int, digest: str) -> None:
+        with self._lock:
+            if nlink > 1 or len(self._done) < self.max_entries:
+                self._done[(key[4], key[3])] = (key, digest)
+
+    def digest(self, key: StatKey, nlink: int, compute: Callable[[], str]) -> str:
+        inode = (key[4], key[3])
+        with self._lock:
+            digest = self._hit(inode, key)
+            if digest is not None:
+                return digest
+            running = self._running.get(inode)
+            if running is None or running[0] != key:
+                event = threading.Event()
+                self._running[inode] = (key, event)
+                running = None
+
+        if running is not None:
+            running[1].wait()
+            with self._lock:
+                digest = self._hit(inode, key)
+            # The other reader failed (or the entry was not kept): read it here
+            return digest if digest is not None else compute()
+
+        try:
+            digest = compute()
+            self.remember(key, nlink, digest)
+            return digest
+        finally:
+            with self._lock:
+                self._running.pop(inode, None)
+            event.set()
+
+    def summary(self) -> str:
+        return f"Inode dedup: {self.avoided} redundant reads avoided ({self.avoided_bytes / 1e6:.1f} MB)"
+
+
+def hash_entry(
+    p: str,
+    cached: Optional[Tuple[str, Optional[StatKey]]] = None,
+    st: Optional[os.stat_result] = None,
+    opts: HashOptions = HashOptions(),
+) -> Record:
+    """Hash one list entry.
+
+    If `cached` holds a (digest, stat) pair and the file's stat data still
+    matches it, the digest is reused without reading the file. `st` can be
+    passed in when the caller already has it (e.g. from os.scandir).
+    """
+    try:
+        st = st or os.stat(p)
+    except OSError:
+        return Record(p, "MISSING")
+    if not stat.S_ISREG(st.st_mode):
+        return Record(p, "MISSING")
+
+    key = stat_key(st)
+    # A marker is never a cache hit: an ERROR must be retried on the next run
+    if cached is not None and cached[1] == key and cached[0] not in MARKERS:
+        # Not handed to opts.dedup: only digests read from the file may be shared,
+        # or a hardlink forced to rehash (--rolling, no baseline entry) would get this one
+        return Record(p, cached[0], key, cached=True)
+    try:
+        if opts.dedup:
+            return Record(p, opts.dedup.digest(key, st.st_nlink, lambda: file_digest(Path(p), key[0], opts)), key)
+        return Record(p, file_digest(Path(p), st.st_size, opts), key)
+    except OSError:
+        return Record(p, "ERROR", key)
+
+
+MOUNTINFO = Path("/proc/self/mountinfo")
+
+
+def load_mounts() -> List[Tuple[str, int]]:
+    """(mount point, st_dev) pairs from /proc/self/mountinfo, longest mount point first.
+
+    Lets work be routed by device without calling stat(), which is exactly
+    what hangs on a dead NFS mount. Empty where there is no mountinfo.
+    """
+    mounts = []
+    try:
+        lines = MOUNTINFO.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 5:
+            continue
+        major, _, minor = fields[2].partition(":")
+        point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[4])
+        try:
+            mounts.append((point.rstrip("/") + "/", os.makedev(int(major), int(minor))))
+        except ValueError:
+            continue
+    mounts.sort(key=lambda m: len(m[0]), reverse=True)
+    return mounts
+
+
+class Job:
+    __slots__ = ("future", "dev", "started")
+
+    def __init__(self, dev: int) -> None:
+        self.future: Future = Future()
+        self.dev = dev
+        self.started = 0.0  # set by the worker when it picks the job up
+
+
+class DevicePool:
+    """A bounded set of daemon worker threads for one device.
+
+    Daemon threads, unlike ThreadPoolExecutor's, don't keep the process
+    alive when one of them never comes back from a hung read.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.threads = 0
+        self.hung = 0  # workers still busy with a job that already timed out
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    def submit(self, job: Job, fn: Callable, args: tuple) -> None:
+        self.queue.put((job, fn, args))
+        if self.threads < self.size:
+            self.threads += 1
+            threading.Thread(target=self._work, name=f"fic-dev{job.dev}", daemon=True).start()
+
+    def close(self) -> None:
+        """Let every worker exit once the queue is drained (a hung one when it comes back)."""
+        for _ in range(self.threads):
+            self.queue.put(None)
+        self.threads = 0
+
+    def _work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job, fn, args = item
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            job.started = time.monotonic()
+            try:
+                job.future.set_result(fn(*args))
+            except BaseException as e:
+                job.future.set_exception(e)
+
+
+class DevicePools:
+    """One DevicePool per st_dev, with a per-job deadline.
+
+    A slow or hung mount only ties up its own `jobs` threads while the others
+    keep hashing. A job that runs longer than `timeout` seconds is given up on
+    (its thread can't be killed and stays busy). Once every thread of a device
+    is stuck like that, its remaining files fail right away instead of each
+    waiting for the deadline.
+    """
+
+    def __init__(self, jobs: int, timeout: float = 0) -> None:
+        self.jobs = jobs
+        self.timeout = timeout
+        self.mounts = load_mounts()
+        self._pools: Dict[int, DevicePool] = {}
+        self._lock = threading.Lock()
+
+    def device(self, path: str, st: Optional[os.stat_result] = None) -> int:
+        if st is not None:
+            return st.st_dev
+        full = os.path.abspath(path)
+        for point, dev in self.mounts:
+            if full.startswith(point) or full + "/" == point:
+                return dev
+        return 0
+
+    def stalled(self, dev: int) -> bool:
+        pool = self._pools.get(dev)
+        return pool is not None and pool.hung >= pool.size
+
+    def submit(self, dev: int, fn: Callable, *args) -> Job:
+        job = Job(dev)
+        with self._lock:
+            if self.stalled(dev):
+                job.future.cancel()
+                return job
+            pool = self._pools.get(dev)
+            if pool is None:
+                pool = self._pools[dev] = DevicePool(self.jobs)
+        pool.submit(job, fn, args)
+        return job
+
+    def result(self, job: Job, on_timeout: Callable[[], Any]) -> Any:
+        """The job's result, or on_timeout() if it ran past the deadline or its device is stalled."""
+        while True:
+            if job.future.cancelled():
+                return on_timeout()
+            if not self.timeout:
+                return job.future.result()
+            started = job.started
+            wait = self.timeout - (time.monotonic() - started) if started else 0.05
+            try:
+                return job.future.result(timeout=max(wait, 0.001))
+            except FutureTimeout:
+                pass
+            pool = None
+            with self._lock:
+                if job.future.done():
+                    continue  # finished right after the wait timed out
+                if job.started and time.monotonic() - job.started >= self.timeout:
+                    pool = self._pools[job.dev]
+                    pool.hung += 1
+                elif not job.started and self.stalled(job.dev):
+                    job.future.cancel()  # fails if a worker took it meanwhile, then keep waiting
+            if pool is not None:
+                # Outside the lock: a job that is done by now runs the callback right here
+                job.future.add_done_callback(lambda _f, pool=pool: self._unhang(pool))
+                return on_timeout()
+
+    def _unhang(self, pool: DevicePool) -> None:
+        with self._lock:
+            pool.hung -= 1
+
+    def close(self) -> None:
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+
+
+def hash_paths(
+    entries: Iterable[WatchEntry],
+    jobs: int = 1,
+    lookup: Optional[Lookup] = None,
+    opts: HashOptions = HashOptions(),
+) -> Iterator[Record]:
+    """Hash entries with worker threads (`jobs` per device), yielding records in input order.
+
+    `lookup` is called from the calling thread only, so it may use a SQLite connection.
+    With opts.timeout a file that takes longer is recorded as TIMEOUT.
+    """
+    lookup = lookup or (lambda p: None)
+    if jobs <= 1 and not opts.timeout and opts.order == "list":
+        for p, st in entries:
+            yield hash_entry(p, lookup(p), st, opts)
+        return
+
+    # The workers are stopped when the scan ends (or the generator is closed early),
+    # so a daemon or library user running many scans does not pile up threads
+    pools = DevicePools(jobs, opts.timeout)
+    try:
+        if opts.order != "list":
+            yield from hash_in_disk_order(entries, pools, lookup, opts)
+            return
+
+        # Keep a bounded window of in-flight files so huge lists are not queued up front
+        window = jobs * 4
+        pending: Deque[Tuple[str, Job]] = deque()
+        for p, st in entries:
+            pending.append((p, pools.submit(pools.device(p, st), hash_entry, p, lookup(p), st, opts)))
+            if len(pending) >= window:
+                p, job = pending.popleft()
+                yield pools.result(job, lambda: Record(p, "TIMEOUT"))
+        while pending:
+            p, job = pending.popleft()
+            yield pools.result(job, lambda: Record(p, "TIMEOUT"))
+    finally:
+        pools.close()
+
+
+# linux/fs.h: _IOWR('f', 11, struct fiemap)
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("=QQIIII")  # fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count
+FIEMAP_EXTENT = struct.Struct("=QQQ16xI12x")  # fe_logical, fe_physical, fe_length, fe_flags
+FIEMAP_EXTENT_UNKNOWN = 0x2  # also set for delayed allocation: no physical block yet
+
+
+def first_extent(path: str) -> Optional[int]:
+    """Physical byte offset of a file's first extent (Linux FIEMAP), None if unknown."""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return None
+    buf = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+    FIEMAP_HEADER.pack_into(buf, 0, 0, 2**64 - 1, 0, 0, 1, 0)
+    try:
+        with open(path, "rb", buffering=0) as f:
+            fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, buf, True)
+    except OSError:
+        return None  # no FIEMAP on this filesystem (tmpfs, NFS, ...) or no access
+    if not FIEMAP_HEADER.unpack_from(buf)[3]:
+        return None  # empty or inline file
+    _, physical, _, flags = FIEMAP_EXTENT.unpack_from(buf, FIEMAP_HEADER.size)
+    return None if flags & FIEMAP_EXTENT_UNKNOWN else physical
+
+
+def disk_position(entry: WatchEntry, order: str) -> Tuple[tuple, Optional[os.stat_result]]:
+    """Sort key for reading an entry in disk order, plus its stat result (reused for hashing)."""
+    st = entry.st
+    if st is None:
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            return (1,), None  # missing files last, nothing to read
+    if order == "extent" and stat.S_ISREG(st.st_mode):
+        phys = first_extent(entry.path)
+        if phys is not None:
+            return (0, st.st_dev, phys, st.st_ino), st
+    return (0, st.st_dev, -1, st.st_ino), st
+
+
+def hash_in_disk_order(
+    entries: Iterable[WatchEntry],
+    pools: DevicePools,
+    lookup: Lookup,
+    opts: HashOptions,
+) -> Iterator[Record]:
+    """hash_paths() for --order inode/extent: read each batch in disk order.
+
+    Entries are taken LOCALITY_BATCH at a time, stat'ed (and FIEMAP'ed) in the
+    pools, submitted sorted by (device, first extent or inode) and yielded
+    back in list order. On spinning disks this turns random seeks into mostly
+    forward sweeps; memory stays bounded by the batch size.
+    """
+    it = iter(entries)
+    timed_out: Tuple[tuple, Optional[os.stat_result]] = ((2,), None)
+    while True:
+        batch = list(itertools.islice(it, LOCALITY_BATCH))
+        if not batch:
+            return
+        stat_jobs = [pools.submit(pools.device(e.path, e.st), disk_position, e, opts.order) for e in batch]
+        positions = [pools.result(job, lambda: timed_out) for job in stat_jobs]
+        cached = [lookup(e.path) for e in batch]
+        jobs: List[Optional[Job]] = [None] * len(batch)
+        for i in sorted(range(len(batch)), key=lambda i: positions[i][0]):
+            if positions[i] is not timed_out:
+                st = positions[i][1]
+                dev = pools.device(batch[i].path, st)
+                jobs[i] = pools.submit(dev, hash_entry, batch[i].path, cached[i], st, opts)
+        for e, job in zip(batch, jobs):
+            yield pools.result(job, lambda: Record(e.path, "TIMEOUT")) if job else Record(e.path, "TIMEOUT")
+
+
+def write_hash_file(records: Iterable[Record], out_files: List[Path], meta_file: Path) -> Tuple[int, int]:
+    """Write one hash file per algorithm plus the stat sidecar.
+
+    Returns (entries, reused from cache).
+    """
+    meta_file.parent.mkdir(parents=True, exist_ok=True)
+
+    total = reused = 0
+    outs = [out.open("w", encoding="utf-8") for out in out_files]
+    with meta_file.open("w", encoding="utf-8") as m:
+        for rec in records:
+            # Same format as sha256sum: "<hash>  <path>"
+            for f, digest in zip(outs, split_digest(rec.digest, len(outs))):
+                f.write(f"{digest}  {rec.path}\n")
+            if rec.stat is not None:
+                m.write(" ".join(map(str, rec.stat)) + f"  {rec.path}\n")
+            total += 1
+            reused += rec.cached
+    for f in outs:
+        f.close()
+    return total, reused
+
+
+def parse_hash_line(raw: str) -> Optional[Tuple[str, str]]:
+    """Parse one "<hash>  <path>" line into (path, hash/marker)."""
+    line = raw.rstrip("\r\n")
+    if not line:
+        return None
+    # Split once: first token is hash/marker, the rest is the path
+    parts = line.split(maxsplit=1)
+    if len(parts) != 2:
+        return None
+    return parts[1].lstrip(" *"), parts[0]
+
+
+def parse_hash_file(hash_file: Path) -> Dict[str, str]:
+    """Parse a baseline/scan file into a dict: path -> hash/marker."""
+    if not hash_file.exists():
+        raise FicError(f"File not found: {hash_file}")
+
+    mapping: Dict[str, str] = {}
+    for raw in hash_file.read_text(encoding="utf-8").splitlines():
+        parsed = parse_hash_line(raw)
+        if parsed:
+            mapping[parsed[0]] = parsed[1]
+    return mapping
+
+
+def iter_hash_file(hash_file: Path) -> Iterator[Tuple[str, str]]:
+    """Stream (path, hash/marker) pairs from a baseline/scan file, one line at a time."""
+    if not hash_file.exists():
+        raise FicError(f"File not found: {hash_file}")
+
+    with hash_file.open("r", encoding="utf-8") as f:
+        for raw in f:
+            parsed = parse_hash_line(raw)
+            if parsed:
+                yield parsed
+
+
+def parse_hash_files(hash_files: List[Path]) -> Dict[str, str]:
+    """Parse the per-algorithm files of one baseline/scan into path -> joined digests."""
+    maps = [parse_hash_file(f) for f in hash_files]
+    if len(maps) == 1:
+        return maps[0]
+    return {path: join_digests([m.get(path, "ERROR") for m in maps]) for path in maps[0]}
+
+
+def iter_hash_files(hash_files: List[Path]) -> Iterator[Tuple[str, str]]:
+    """Stream (path, joined digests) from per-algorithm files written side by side."""
+    if len(hash_files) == 1:
+        yield from iter_hash_file(hash_files[0])
+        return
+    for pairs in zip(*(iter_hash_file(f) for f in hash_files)):
+        yield pairs[0][0], join_digests([digest for _, digest in pairs])
+
+
+def parse_meta_file(meta_file: Path) -> Dict[str, StatKey]:
+    """Parse a stat sidecar file into a dict: path -> stat key.
+
+    A missing file just means no cached stat data (e.g. an older baseline).
+    """
+    mapping: Dict[str, StatKey] = {}
+    if not meta_file.exists():
+        return mapping
+
+    for raw in meta_file.read_text(encoding="utf-8").splitlines():
+        parsed = parse_meta_line(raw)
+        if parsed:
+            mapping[parsed[0]] = parsed[1]
+    return mapping
+
+
+def parse_meta_line(raw: str) -> Optional[Tuple[str, StatKey]]:
+    """Parse one "<size> <mtime_ns> <ctime_ns> <ino> <dev>  <path>" line."""
+    fields, sep, path = raw.rstrip("\r\n").partition("  ")
+    nums = fields.split()
+    if not sep or len(nums) != 5:
+        return None
+    try:
+        return path, tuple(int(n) for n in nums)  # type: ignore[return-value]
+    except ValueError:
+        return None
+
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(state: dict) -> None:
+    DB_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = DB_DIR / ".state_tmp"
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+
+def record_line(rec: Record) -> bytes:
+    """Serialize a full record (digest, stat, cached flag, path) as one tab separated line."""
+    st = " ".join(map(str, rec.stat)) if rec.stat else "-"
+    return f"{rec.digest}\t{st}\t{int(rec.cached)}\t{rec.path}\n".encode("utf-8")
+
+
+def parse_record_line(raw: bytes) -> Record:
+    digest, st, cached, path = raw.decode("utf-8").rstrip("\n").split("\t", 3)
+    key = tuple(int(n) for n in st.split()) if st != "-" else None
+    return Record(path, digest, key, cached == "1")  # type: ignore[arg-type]
+
+
+class ScanJournal:
+    """Records of a running check, appended as they are hashed, so it can be resumed.
+
+    Every CHECKPOINT_EVERY records (or CHECKPOINT_SECONDS) the journal is
+    fsynced and db/scan.checkpoint.json is replaced with its length, the number
+    of records and the last path. After a crash only the part covered by the
+    checkpoint is trusted, anything after it is cut off on resume.
+    """
+
+    def __init__(self) -> None:
+        self.checkpoint: dict = {}
+        self.f: Optional[BinaryIO] = None
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def load() -> Optional[dict]:
+        try:
+            cp = json.loads(SCAN_CHECKPOINT.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if not SCAN_JOURNAL.exists() or SCAN_JOURNAL.stat().st_size < cp.get("offset", 0):
+            return None
+        return cp
+
+    def start(self, checkpoint: dict) -> None:
+        """Open the journal, keeping the records covered by `checkpoint` (offset 0 = new scan)."""
+        DB_DIR.mkdir(parents=True, exist_ok=True)
+        self.checkpoint = dict(checkpoint)
+        self.checkpoint.setdefault("offset", 0)
+        self.checkpoint.setdefault("count", 0)
+        self.checkpoint.setdefault("last", None)
+        self.f = SCAN_JOURNAL.open("r+b" if self.checkpoint["offset"] else "wb")
+        self.f.truncate(self.checkpoint["offset"])
+        self._save()
+
+    def replay(self) -> Iterator[Record]:
+        """The records a resumed check already has."""
+        with SCAN_JOURNAL.open("rb") as f:
+            for _ in range(self.checkpoint["count"]):
+                yield parse_record_line(f.readline())
+
+    def record(self, records: Iterable[Record]) -> Iterator[Record]:
+        """Pass records through, appending each one to the journal."""
+        assert self.f is not None
+        self.f.seek(self.checkpoint["offset"])
+        pending = 0
+        for rec in records:
+            self.f.write(record_line(rec))
+            pending += 1
+            self.checkpoint["count"] += 1
+            self.checkpoint["last"] = rec.path
+            if pending >= CHECKPOINT_EVERY or time.monotonic() - self._last_sync >= CHECKPOINT_SECONDS:
+                self._sync()
+                pending = 0
+            yield rec
+        self._sync()
+
+    def _sync(self) -> None:
+        assert self.f is not None
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.checkpoint["offset"] = self.f.tell()
+        self._save()
+        self._last_sync = time.monotonic()
+
+    def _save(self) -> None:
+        tmp = SCAN_CHECKPOINT.with_name(".checkpoint_tmp")
+        tmp.write_text(json.dumps(self.checkpoint, sort_keys=True) + "\n", encoding="utf-8")
+        tmp.replace(SCAN_CHECKPOINT)
+
+    def finish(self) -> None:
+        """The scan is in the store, the journal is no longer needed."""
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        SCAN_CHECKPOINT.unlink(missing_ok=True)
+        SCAN_JOURNAL.unlink(missing_ok=True)
+
+
+def rolling_slice(path: str, n: int) -> int:
+    """Which of n slices a path belongs to; stable across runs and list edits."""
+    return zlib.crc32(path.encode("utf-8", errors="surrogateescape")) % n
+
+
+def rolling_lookup(lookup: Lookup, cursor: int, n: int) -> Lookup:
+    """Stat cache lookup that misses for every path in slice `cursor`, so those get rehashed."""
+    return lambda p: None if rolling_slice(p, n) == cursor else lookup(p)
+
+
+def skip_entries(entries: Iterator[WatchEntry], count: int, last: Optional[str]) -> bool:
+    """Advance past the `count` entries a resumed check already has.
+
+    Returns False if the list no longer lines up with the checkpoint.
+    """
+    entry = None
+    for entry in itertools.islice(entries, count):
+        pass
+    return count == 0 or (entry is not None and entry.path == last)
+
+
+def classify(bhash: Optional[str], shash: Optional[str]) -> Optional[str]:
+    """Return the change kind for a baseline/scan pair, or None if unchanged."""
+    if bhash is None:
+        return "NEW"
+    if shash is None:
+        return "UNSCANNED"
+    if shash in MARKERS:
+        return shash
+    if bhash != shash:
+        return "MODIFIED"
+    return None
+
+
+def compare_maps(base: Dict[str, str], scan: Dict[str, str]) -> Iterator[Change]:
+    # Compare entries from baseline
+    for path, bhash in sorted(base.items()):
+        shash = scan.get(path)
+        kind = classify(bhash, shash)
+        if kind:
+            yield Change(kind, path, bhash, shash)
+
+    # Anything that shows up now but wasn't in baseline
+    for path in sorted(scan.keys() - base.keys()):
+        yield Change("NEW", path, None, scan[path])
+
+
+def merge_join(base: Iterator[Tuple[str, str]], scan: Iterator[Tuple[str, str]]) -> Iterator[Change]:
+    """Compare two path-sorted streams in one pass, holding one entry of each.
+
+    Changes come out in path order (NEW entries are mixed in, not listed last).
+    """
+    base = dedupe_sorted(base)
+    scan = dedupe_sorted(scan)
+    b = next(base, None)
+    s = next(scan, None)
+    while b is not None or s is not None:
+        if s is None or (b is not None and b[0] < s[0]):
+            yield Change("UNSCANNED", b[0], b[1], None)
+            b = next(base, None)
+        elif b is None or s[0] < b[0]:
+            yield Change("NEW", s[0], None, s[1])
+            s = next(scan, None)
+        else:
+            kind = classify(b[1], s[1])
+            if kind:
+                yield Change(kind, b[0], b[1], s[1])
+            b = next(base, None)
+            s = next(scan, None)
+
+
+def dedupe_sorted(pairs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """Keep only the last of several adjacent entries for the same path (like a dict would)."""
+    prev: Optional[Tuple[str, str]] = None
+    for pair in pairs:
+        if prev is not None and prev[0] != pair[0]:
+            yield prev
+        prev = pair
+    if prev is not None:
+        yield prev
+
+
+def event_object(event: str, path: Optional[str], old: Optional[str] = None, new: Optional[str] = None, **extra: Any) -> dict:
+    """One change event as sent to --output and --alert targets."""
+    obj = {"ts": datetime.now().astimezone().isoformat(timespec="seconds"), "event": event}
+    if path is not None:
+        obj.update(path=path, old=old, new=new)
+    obj.update(extra)
+    return obj
+
+
+def stream_changes(records: Iterable[Record], lookup: Lookup, sinks: List[Any]) -> Iterator[Record]:
+    """Pass scan records through, emitting an event for every one that differs from the baseline."""
+    for rec in records:
+        base = lookup(rec.path)
+        kind = classify(base[0] if base else None, rec.digest)
+        if kind:
+            st = dict(zip(("size", "mtime_ns", "ctime_ns", "ino", "dev"), rec.stat)) if rec.stat else {}
+            for sink in sinks:
+                sink.emit(kind, rec.path, base[0] if base else None, rec.digest, **st)
+        yield rec
+
+
+def stream_unscanned(changes: Iterable[Change], sinks: List[Any]) -> Iterator[Change]:
+    """Only known after the scan: baseline entries that are not in the list any more."""
+    for change in changes:
+        if change.kind == "UNSCANNED":
+            for sink in sinks:
+                sink.emit(change.kind, change.path, change.old, change.new)
+        yield change
+
+
+class EventSink:
+    """NDJSON change events (`check --output ndjson[:path|-]`), written by a background thread.
+
+    One JSON object per change with path, old/new digest, stat data and a
+    timestamp. The queue is bounded: when the consumer (a pipe into a SIEM
+    shipper, a slow disk) falls behind, emit() blocks and the scan waits
+    instead of buffering without limit. If the consumer goes away, the rest
+    of the events are dropped and the scan goes on.
+    """
+
+    def __init__(self, spec: str, maxsize: int = EVENT_QUEUE) -> None:
+        fmt, _, target = spec.partition(":")
+        if fmt != "ndjson":
+            raise FicError(f"Unknown output format: {fmt} (supported: ndjson[:path|-])")
+        self.target = target or "-"
+        if self.target == "-":
+            self.f: TextIO = sys.stdout
+        else:
+            try:
+                self.f = open(self.target, "a", encoding="utf-8")
+            except OSError as e:
+                raise FicError(f"Can't open {self.target}: {e.strerror}") from None
+        self.count = 0
+        self.error: Optional[Exception] = None
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self._write, name="fic-events", daemon=True)
+        self.thread.start()
+
+    def _write(self) -> None:
+        while True:
+            line = self.queue.get()
+            if line is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.f.write(line)
+                if self.queue.empty():
+                    self.f.flush()
+            except (OSError, ValueError) as e:
+                self.error = e
+
+    def emit(self, event: str, path: Optional[str], old: Optional[str] = None, new: Optional[str] = None, **extra: Any) -> None:
+        obj = event_object(event, path, old, new, **extra)
+        self.queue.put(json.dumps(obj, ensure_ascii=False) + "\n")  # blocks while the queue is full
+        self.count += 1
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        if self.f is not sys.stdout:
+            self.f.close()
+        if self.error is not None:
+            log(f"Event output to {self.target} failed, events were dropped: {self.error}", level="warning")
+
+
+class AlertSink:
+    """Base of the --alert targets: a queue drained by a worker thread in batches.
+
+    emit() never blocks the scan: if the queue is full (target down for a
+    long time) the event is dropped and counted. The worker sends up to
+    ALERT_BATCH events at once, waiting at most ALERT_BATCH_SECONDS for a
+    batch to fill, and retries a failed batch with exponential backoff.
+    Delivery is at least once: a retried batch may repeat events.
+    """
+
+    kind = "alert"
+
+    def __init__(self, target: str) -> None:
+        self.target = target
+        self.sent = self.dropped = self.failed = 0
+        self.inflight = 0  # size of the batch the worker is sending right now
+        self.last_error: Optional[Exception] = None
+        self.queue: queue.Queue = queue.Queue(ALERT_QUEUE)
+        self.thread = threading.Thread(target=self._work, name=f"fic-{self.kind}", daemon=True)
+        self.thread.start()
+
+    def emit(self, event: str, path: Optional[str], old: Optional[str] = None, new: Optional[str] = None, **extra: Any) -> None:
+        try:
+            self.queue.put_nowait(event_object(event, path, old, new, **extra))
+        except queue.Full:
+            self.dropped += 1
+
+    def _work(self) -> None:
+        done = False
+        while not done:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + ALERT_BATCH_SECONDS
+            while len(batch) < ALERT_BATCH:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            self._deliver(batch)
+
+    def _deliver(self, batch: List[dict]) -> None:
+        self.inflight = len(batch)
+        try:
+            for attempt in range(ALERT_RETRIES):
+                if attempt:
+                    time.sleep(min(ALERT_MAX_BACKOFF, 2 ** (attempt - 1)))
+                try:
+                    self.send(batch)
+                    self.sent += len(batch)
+                    return
+                except Exception as e:  # any failure (e.g. http.client.IncompleteRead) is retried
+                    self.last_error = e
+            self.failed += len(batch)
+        finally:
+            self.inflight = 0
+
+    def send(self, batch: List[dict]) -> None:
+        raise NotImplementedError
+
+    def close(self, timeout: float = ALERT_DRAIN_SECONDS) -> None:
+        """Deliver what is queued, waiting at most `timeout` seconds."""
+        try:
+            self.queue.put(None, timeout=timeout)
+            self.thread.join(timeout)
+        except queue.Full:
+            pass
+        with self.queue.mutex:
+            queued = sum(1 for item in self.queue.queue if item is not None)
+        lost = self.dropped + self.failed + queued + (self.inflight if self.thread.is_alive() else 0)
+        if lost:
+            log(
+                f"WARNING: {self.kind} alerts to {self.target}: {self.sent} sent, {lost} not delivered"
+                + (f" (last error: {self.last_error})" if self.last_error else ""),
+                level="warning",
+            )
+
+
+class WebhookSink(AlertSink):
+    """POST {"source", "host", "events": [...]} as JSON to an HTTP(S) URL."""
+
+    kind = "webhook"
+
+    def send(self, batch: List[dict]) -> None:
+        body = json.dumps({"source": "fic", "host": socket.gethostname(), "events": batch}).encode("utf-8")
+        req = urllib.request.Request(self.target, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=ALERT_HTTP_TIMEOUT) as resp:
+            resp.read()
+
+
+class SyslogSink(AlertSink):
+    """One datagram per event to the local syslog socket (facility auth, severity warning)."""
+
+    kind = "syslog"
+
+    def send(self, batch: List[dict]) -> None:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(self.target)
+            for obj in batch:
+                sock.send(f"<{SYSLOG_PRI}>fic[{os.getpid()}]: {json.dumps(obj, ensure_ascii=False)}".encode("utf-8"))
+
+
+class SpoolSink(AlertSink):
+    """One NDJSON file per batch in a directory, renamed into place when complete."""
+
+    kind = "spool"
+
+    def __init__(self, target: str) -> None:
+        self.seq = 0
+        super().__init__(target)
+
+    def send(self, batch: List[dict]) -> None:
+        spool = Path(self.target)
+        spool.mkdir(parents=True, exist_ok=True)
+        self.seq += 1
+        name = f"fic-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{self.seq:06d}.ndjson"
+        tmp = spool / f".{name}.tmp"
+        tmp.write_text("".join(json.dumps(obj, ensure_ascii=False) + "\n" for obj in batch), encoding="utf-8")
+        tmp.replace(spool / name)
+
+
+def open_alert_sink(spec: str) -> AlertSink:
+    """http(s)://..., webhook:URL, syslog[:socket path] or spool:DIR."""
+    kind, _, target = spec.partition(":")
+    if kind in ("http", "https"):
+        return WebhookSink(spec)
+    if kind == "webhook" and target:
+        return WebhookSink(target)
+    if kind == "syslog":
+        return SyslogSink(target or SYSLOG_SOCKET)
+    if kind == "spool" and target:
+        return SpoolSink(target)
+    raise FicError(f"Unknown alert target: {spec} (use http(s)://..., webhook:URL, syslog[:PATH] or spool:DIR)")
+
+
+def report_changes(changes: Iterable[Change]) -> int:
+    count = 0
+    for change in changes:
+        log(
+            f"{CHANGE_MESSAGES[change.kind]}: {change.path}",
+            level="alert",
+            event=change.kind,
+            path=change.path,
+            old=change.old,
+            new=change.new,
+        )
+        count += 1
+
+    if count == 0:
+        log("OK: No changes detected.", changes=0)
+    else:
+        log(f"ALERT: Detected {count} change(s). See log: {LOG_FILE}", level="alert", changes=count)
+    LOGGER.flush()
+    return count
+
+
+def merkle_parent(d: str) -> Tuple[str, str]:
+    """Split a directory key like "/etc/ssh/" into ("/etc/", "ssh/")."""
+    head, sep, _ = d[:-1].rpartition("/")
+    parent = head + sep
+    return parent, d[len(parent):]
+
+
+def merkle_ancestors(d: str) -> Iterator[str]:
+    """Yield a directory key and all its parents, up to the root ""."""
+    while d:
+        yield d
+        d = merkle_parent(d)[0]
+    yield ""
+
+
+class MerkleTree:
+    """Merkle tree over path -> digest entries, shaped like the directory tree.
+
+    Every directory gets a node hash computed from its sorted children (file
+    name + digest, subdirectory name + node hash), up to a single root hash.
+    Two trees with the same root hold exactly the same entries, and a diff
+    only has to descend into directories whose hashes differ.
+    Directory keys use "/" and end with it, the root is "".
+    """
+
+    def __init__(self) -> None:
+        self.files: Dict[str, Dict[str, Tuple[str, str]]] = {}  # dir -> name -> (digest, path)
+        self.subdirs: Dict[str, set] = {"": set()}
+        self.nodes: Dict[str, str] = {}
+        # Directories with MISSING/ERROR markers somewhere below: those are
+        # always reported, so a diff has to visit them even if hashes match
+        self.marked: set = set()
+        self.marked_dirs: set = set()  # directories holding a marker entry themselves
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, str]]) -> "MerkleTree":
+        tree = cls()
+        for path, digest in pairs:
+            tree.add(path, digest)
+        tree.finish()
+        return tree
+
+    def add(self, path: str, digest: str) -> None:
+        d, sep, name = to_slash(path).rpartition("/")
+        d += sep
+        self.files.setdefault(d, {})[name] = (digest, path)
+        if digest in MARKERS:
+            self.marked.update(merkle_ancestors(d))
+            self.marked_dirs.add(d)
+        # Link the directory chain upwards until it meets a known directory
+        while d:
+            parent, _ = merkle_parent(d)
+            known = parent in self.subdirs
+            self.subdirs.setdefault(d, set())
+            self.subdirs.setdefault(parent, set()).add(d)
+            if known:
+                break
+            d = parent
+
+    def finish(self) -> "MerkleTree":
+        # Deepest directories first, so children are hashed before their parents
+        for d in sorted(self.subdirs, key=lambda k: k.count("/"), reverse=True):
+            h = hashlib.sha256()
+            children = [(name, "f", digest) for name, (digest, _) in self.files.get(d, {}).items()]
+            children += [(merkle_parent(sub)[1], "d", self.nodes[sub]) for sub in self.subdirs[d]]
+            for name, kind, digest in sorted(children):
+                h.update(f"{kind} {digest} {name}\n".encode("utf-8"))
+            self.nodes[d] = h.hexdigest()
+        return self
+
+    @property
+    def root(self) -> str:
+        return self.nodes[""]
+
+    def save(self, out_file: Path) -> None:
+        data = {
+            "root": self.root,
+            "markers": bool(self.marked),
+            "marked": sorted(self.marked_dirs),
+            "nodes": dict(sorted(self.nodes.items())),
+        }
+        out_file.write_text(json.dumps(data, indent=1) + "\n", encoding="utf-8")
+
+    def diff(self, other: "MerkleTree") -> Tuple[List[Change], int]:
+        """Changes from self (baseline) to other (scan), plus how many directories were visited.
+
+        The changes come out in the same order as compare_maps().
+        """
+        changes: List[Change] = []
+        visited = 0
+        stack = [""]
+        while stack:
+            d = stack.pop()
+            if self.nodes.get(d) == other.nodes.get(d) and d not in other.marked:
+                continue
+            visited += 1
+            mine, theirs = self.files.get(d, {}), other.files.get(d, {})
+            for name in mine.keys() | theirs.keys():
+                bhash, bpath = mine.get(name, (None, None))
+                shash, spath = theirs.get(name, (None, None))
+                kind = classify(bhash, shash)
+                if kind:
+                    changes.append(Change(kind, bpath or spath, bhash, shash))  # type: ignore[arg-type]
+            stack.extend(self.subdirs.get(d, set()) | other.subdirs.get(d, set()))
+        changes.sort(key=lambda c: (c.kind == "NEW", c.path))
+        return changes, visited
+
+
+def merkle_dir(path: str) -> str:
+    """Directory key of a path, as used by MerkleTree ("/etc/ssh/")."""
+    d, sep, _ = to_slash(path).rpartition("/")
+    return d + sep
+
+
+def load_merkle(merkle_file: Path) -> Optional[dict]:
+    """A saved tree (root, node hashes, marked directories), or None if missing or too old."""
+    try:
+        data = json.loads(merkle_file.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    return data if {"root", "nodes", "marked"} <= data.keys() else None
+
+
+def merkle_differing(base: Dict[str, str], scan: Dict[str, str]) -> set:
+    """Directories whose node hashes differ, found by descending only into differing subtrees."""
+    children: Dict[str, List[str]] = {}
+    for d in base.keys() | scan.keys():
+        if d:
+            children.setdefault(merkle_parent(d)[0], []).append(d)
+    differing = set()
+    stack = [""]
+    while stack:
+        d = stack.pop()
+        if base.get(d) == scan.get(d):
+            continue
+        differing.add(d)
+        stack.extend(children.get(d, ()))
+    return differing
+
+
+def load_merkle_root(merkle_file: Path) -> Tuple[Optional[str], bool]:
+    """Return (root hash, has MISSING/ERROR markers) from a saved tree."""
+    try:
+        data = json.loads(merkle_file.read_text(encoding="utf-8"))
+        return data["root"], data.get("markers", True)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None, True
+
+
+def write_sha256sum(records: Iterable[Record], out: TextIO, index: int = 0, n: int = 1) -> int:
+    """Write records as "<hash>  <path>" lines, using the index-th of n joined digests."""
+    count = 0
+    for rec in records:
+        out.write(f"{split_digest(rec.digest, n)[index]}  {rec.path}\n")
+        count += 1
+    return count
+
+
+def read_hash_records(hash_file: Path) -> Iterator[Record]:
+    """Read a sha256sum-style file (plus its .meta sidecar if any) as records."""
+    metas = parse_meta_file(hash_file.with_suffix(".meta"))
+    for path, digest in parse_hash_file(hash_file).items():
+        yield Record(path, digest, metas.get(path))
+
+
+class TextStore:
+    """Baseline and last scan as flat sha256sum-style files in db/ (the default)."""
+
+    name = "text"
+    STEMS = {"baseline": "baseline", "scan": "last_scan"}
+    MERKLE = {"baseline": BASELINE_MERKLE, "scan": LAST_SCAN_MERKLE}
+    # Build a Merkle tree while writing (needs memory for all entries)
+    use_merkle = True
+
+    def __init__(self) -> None:
+        self.algos: Tuple[str, ...] = tuple(load_state().get("algos", DEFAULT_ALGOS))
+
+    def hash_files(self, kind: str) -> List[Path]:
+        """One sha256sum-style file per algorithm, e.g. db/baseline.sha256."""
+        return [DB_DIR / f"{self.STEMS[kind]}.{algo}" for algo in self.algos]
+
+    def meta_file(self, kind: str) -> Path:
+        return DB_DIR / f"{self.STEMS[kind]}.meta"
+
+    def has_baseline(self) -> bool:
+        return self.hash_files("baseline")[0].exists()
+
+    def baseline_lookup(self) -> Lookup:
+        base = parse_hash_files(self.hash_files("baseline"))
+        metas = parse_meta_file(self.meta_file("baseline"))
+
+        def lookup(path: str) -> Optional[Tuple[str, Optional[StatKey]]]:
+            bhash = base.get(path)
+            return (bhash, metas.get(path)) if bhash is not None else None
+
+        return lookup
+
+    def write(self, kind: str, records: Iterable[Record]) -> Tuple[int, int]:
+        outs = self.hash_files(kind)
+        tmps = [DB_DIR / f".{kind}_{algo}_tmp" for algo in self.algos]
+        tmp_meta = DB_DIR / f".{kind}_meta_tmp"
+        tree = MerkleTree() if self.use_merkle else None
+
+        def tee(records: Iterable[Record]) -> Iterator[Record]:
+            for rec in records:
+                if tree is not None:
+                    tree.add(rec.path, rec.digest)
+                yield rec
+
+        counts = write_hash_file(tee(records), tmps, tmp_meta)
+        for tmp, out in zip(tmps, outs):
+            tmp.replace(out)
+        tmp_meta.replace(self.meta_file(kind))
+        if tree is not None:
+            tree.finish().save(self.MERKLE[kind])
+        else:
+            self.MERKLE[kind].unlink(missing_ok=True)
+        return counts
+
+    def copy_baseline_to_scan(self) -> None:
+        # Keep last_scan equal to baseline (simple copy)
+        pairs = list(zip(self.hash_files("baseline"), self.hash_files("scan")))
+        pairs.append((self.meta_file("baseline"), self.meta_file("scan")))
+        if BASELINE_MERKLE.exists():
+            pairs.append((BASELINE_MERKLE, LAST_SCAN_MERKLE))
+        for src, dst in pairs:
+            dst.write_text(src.read_text(encoding="utf-8"), encoding="utf-8")
+
+    def accept(self, paths: Set[str]) -> None:
+        """Make the baseline entries of `paths` equal to the last scan (dropped if not there)."""
+        scan = {rec.path: rec for rec in self.records("scan") if rec.path in paths and rec.digest not in MARKERS}
+
+        def merged() -> Iterator[Record]:
+            for rec in self.records("baseline"):
+                if rec.path not in paths:
+                    yield rec
+                elif rec.path in scan:
+                    yield scan.pop(rec.path)
+            yield from scan.values()
+
+        self.write("baseline", merged())
+
+    def records(self, kind: str) -> Iterator[Record]:
+        metas = parse_meta_file(self.meta_file(kind))
+        for path, digest in iter_hash_files(self.hash_files(kind)):
+            yield Record(path, digest, metas.get(path))
+
+    def changes(self) -> Iterator[Change]:
+        base, scan = load_merkle(BASELINE_MERKLE), load_merkle(LAST_SCAN_MERKLE)
+        if base is None or scan is None:
+            return compare_maps(parse_hash_files(self.hash_files("baseline")), parse_hash_files(self.hash_files("scan")))
+        if base["root"] == scan["root"] and not scan["marked"]:
+            # Same root hash: nothing changed, the baseline does not even need to be read
+            return iter(())
+
+        # Only entries in directories whose saved node hashes differ (or that hold
+        # MISSING/ERROR markers, which are reported every time) are kept and compared
+        dirs = merkle_differing(base["nodes"], scan["nodes"]) | set(scan["marked"])
+        log(f"Merkle tree: comparing {len(dirs)} of {len(scan['nodes'])} directories.")
+
+        def subset(kind: str) -> Dict[str, str]:
+            return {p: h for p, h in iter_hash_files(self.hash_files(kind)) if merkle_dir(p) in dirs}
+
+        return compare_maps(subset("baseline"), subset("scan"))
+
+    def root(self, kind: str) -> str:
+        root, _ = load_merkle_root(self.MERKLE[kind])
+        if root is None:
+            root = MerkleTree.from_pairs(iter_hash_files(self.hash_files(kind))).root
+        return root
+
+    def load_state(self) -> dict:
+        return load_state()
+
+    def save_state(self, state: dict) -> None:
+        save_state(state)
+
+    def close(self) -> None:
+        pass
+
+
+SORT_RUN_SIZE = 100_000
+
+
+def sort_records(records: Iterable[Record], run_size: int = SORT_RUN_SIZE) -> Iterator[Record]:
+    """External merge sort of records by path, in bounded memory.
+
+    Records are sorted in runs of `run_size`, spilled to temp files in db/
+    and merged back with heapq. Duplicate paths keep the last record.
+    """
+    runs: List[BinaryIO] = []
+
+    def spill(chunk: List[Record]) -> None:
+        chunk.sort(key=lambda r: r.path)
+        f = tempfile.TemporaryFile(dir=DB_DIR, prefix=".sort_run")
+        for rec in chunk:
+            f.write(record_line(rec))
+        f.seek(0)
+        runs.append(f)
+
+    def read_run(f: BinaryIO) -> Iterator[Record]:
+        for raw in f:
+            yield parse_record_line(raw)
+
+    chunk: List[Record] = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= run_size:
+            spill(chunk)
+            chunk = []
+
+    try:
+        if not runs:
+            merged: Iterable[Record] = sorted(chunk, key=lambda r: r.path)
+        else:
+            if chunk:
+                spill(chunk)
+            # heapq.merge is stable, so the last duplicate is still the newest one
+            merged = heapq.merge(*(read_run(f) for f in runs), key=lambda r: r.path)
+
+        prev: Optional[Record] = None
+        for rec in merged:
+            if prev is not None and prev.path != rec.path:
+                yield prev
+            prev = rec
+        if prev is not None:
+            yield prev
+    finally:
+        for f in runs:
+            f.close()
+
+
+class SortedLineIndex:
+    """Binary search over a text file whose lines are sorted by path.
+
+    Only a handful of lines are read per lookup, nothing is loaded up front.
+    """
+
+    def __init__(self, path: Path, parse: Callable[[str], Optional[tuple]]) -> None:
+        self.parse = parse
+        self.f: Optional[BinaryIO] = path.open("rb") if path.exists() else None
+        self.size = path.stat().st_size if self.f else 0
+
+    def _line_from(self, pos: int) -> Optional[tuple]:
+        """Parse the first line that starts at offset >= pos."""
+        assert self.f is not None
+        if pos == 0:
+            self.f.seek(0)
+        else:
+            self.f.seek(pos - 1)
+            self.f.readline()
+        raw = self.f.readline()
+        if not raw:
+            return None
+        return self.parse(raw.decode("utf-8", errors="replace")) or ("", None)
+
+    def lower_bound(self, key: str) -> int:
+        """Offset from which _line_from() returns the first line with key >= `key`."""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._line_from(mid)
+            if entry is None or entry[0] >= key:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def lines_from(self, pos: int) -> Iterator[str]:
+        """Yield the raw lines starting with the first one at offset >= pos."""
+        if self.f is None:
+            return
+        self.f.seek(pos - 1 if pos else 0)
+        if pos:
+            self.f.readline()
+        for raw in self.f:
+            yield raw.decode("utf-8", errors="replace")
+
+    def find(self, path: str):
+        if self.f is None:
+            return None
+        entry = self._line_from(self.lower_bound(path))
+        if entry is not None and entry[0] == path:
+            return entry[1]
+        return None
+
+    def close(self) -> None:
+        if self.f:
+            self.f.close()
+
+
+class SortedTextStore(TextStore):
+    """Same text files, but kept sorted by path.
+
+    Memory stays constant however long the list is: scans are written with an
+    external sort, stat lookups are binary searches in the baseline files and
+    the comparison is a single merge-join pass over both files.
+    """
+
+    name = "sorted"
+    use_merkle = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._indexes: List[SortedLineIndex] = []
+
+    def baseline_lookup(self) -> Lookup:
+        hashes = [SortedLineIndex(f, parse_hash_line) for f in self.hash_files("baseline")]
+        metas = SortedLineIndex(self.meta_file("baseline"), parse_meta_line)
+        self._indexes += hashes + [metas]
+
+        def lookup(path: str) -> Optional[Tuple[str, Optional[StatKey]]]:
+            parts = [index.find(path) for index in hashes]
+            if None in parts:
+                return None
+            return join_digests(parts), metas.find(path)  # type: ignore[arg-type]
+
+        return lookup
+
+    def write(self, kind: str, records: Iterable[Record]) -> Tuple[int, int]:
+        return super().write(kind, sort_records(records))
+
+    def changes(self) -> Iterator[Change]:
+        return merge_join(iter_hash_files(self.hash_files("baseline")), iter_hash_files(self.hash_files("scan")))
+
+    def root(self, kind: str) -> str:
+        return MerkleTree.from_pairs(iter_hash_files(self.hash_files(kind))).root
+
+    def close(self) -> None:
+        for index in self._indexes:
+            index.close()
+        self._indexes = []
+
+
+# Binary table (db/baseline.fic): header, block offsets, raw digests, stat records, paths.
+# All sections are in path order, entry i has its digest and stat at fixed offsets.
+BIN_MAGIC = b"FICB"
+BIN_VERSION = 1
+BIN_HEADER = struct.Struct("<4sIIIQQQQ")  # magic, version, digest size, block, count, 3 section offsets
+BIN_STAT = struct.Struct("<B7xqqqQQ")  # flags, then the StatKey
+BIN_OFFSET = struct.Struct("<Q")
+# Paths are front-coded in blocks: the first path in full, the others as
+# (length shared with the previous path, rest). Lookups bisect the block heads.
+# "surrogatepass" keeps the byte order equal to the str order records are sorted in.
+PATH_BLOCK = 16
+BIN_HAS_STAT = 0x04  # low two flag bits: 0 = digest, else index into MARKERS + 1
+
+
+def write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(buf, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def digest_sizes(algos: Tuple[str, ...]) -> List[int]:
+    return [new_hasher(algo).digest_size for algo in algos]
+
+
+def write_binary_table(records: Iterable[Record], out_file: Path, sizes: List[int]) -> Tuple[int, int]:
+    """Write records (sorted by path, no duplicates) as a binary table."""
+    total = reused = 0
+    offsets = array.array("Q")
+    empty = bytes(sum(sizes))
+    digests = tempfile.TemporaryFile(dir=DB_DIR, prefix=".bin_digests")
+    stats = tempfile.TemporaryFile(dir=DB_DIR, prefix=".bin_stats")
+    paths = tempfile.TemporaryFile(dir=DB_DIR, prefix=".bin_paths")
+    try:
+        blob = bytearray()
+        blob_size = 0
+        prev = b""
+        for rec in records:
+            name = rec.path.encode("utf-8", "surrogatepass")
+            if total % PATH_BLOCK == 0:
+                paths.write(blob)
+                blob_size += len(blob)
+                blob.clear()
+                offsets.append(blob_size)
+                write_varint(blob, len(name))
+                blob += name
+            else:
+                shared = len(os.path.commonprefix([prev, name]))
+                write_varint(blob, shared)
+                write_varint(blob, len(name) - shared)
+                blob += name[shared:]
+            prev = name
+
+            if rec.digest in MARKERS:
+                flags = MARKERS.index(rec.digest) + 1
+                digests.write(empty)
+            else:
+                flags = 0
+                raw = bytes.fromhex(rec.digest.replace(":", ""))
+                if len(raw) != len(empty):
+                    raise FicError(f"Digest of {rec.path} is {len(raw)} bytes, expected {len(empty)}")
+                digests.write(raw)
+            if rec.stat is not None:
+                flags |= BIN_HAS_STAT
+            stats.write(BIN_STAT.pack(flags, *(rec.stat or (0,) * 5)))
+            total += 1
+            reused += rec.cached
+        paths.write(blob)
+
+        digests_at = BIN_HEADER.size + len(offsets) * BIN_OFFSET.size
+        stats_at = digests_at + total * len(empty)
+        paths_at = stats_at + total * BIN_STAT.size
+        with out_file.open("wb") as f:
+            f.write(BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, len(empty), PATH_BLOCK, total, digests_at, stats_at, paths_at))
+            f.write(offsets.tobytes() if sys.byteorder == "little" else struct.pack(f"<{len(offsets)}Q", *offsets))
+            for section in (digests, stats, paths):
+                section.seek(0)
+                shutil.copyfileobj(section, f, 1 << 20)
+    finally:
+        for section in (digests, stats, paths):
+            section.close()
+    return total, reused
+
+
+class BinaryTable:
+    """Read side of a binary table, memory-mapped.
+
+    Opening it reads only the header; a lookup bisects the block heads and
+    decodes at most one block of paths, touching a few pages of the file.
+    """
+
+    def __init__(self, path: Path, sizes: List[int]) -> None:
+        self.sizes = sizes
+        try:
+            self.f = path.open("rb")
+        except OSError as e:
+            raise FicError(f"Can't open {path}: {e.strerror}") from None
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) if path.stat().st_size else b""
+        try:
+            if len(self.mm) < BIN_HEADER.size:
+                raise FicError(f"Not a binary baseline: {path}")
+            magic, version, self.digest_size, self.block, self.count, self.digests_at, self.stats_at, self.paths_at = (
+                BIN_HEADER.unpack_from(self.mm)
+            )
+            if magic != BIN_MAGIC or version != BIN_VERSION:
+                raise FicError(f"Not a binary baseline (or a newer version): {path}")
+            if self.digest_size != sum(sizes):
+                raise FicError(f"{path} has {self.digest_size}-byte digests, the recorded algorithms need {sum(sizes)}")
+            self.blocks = (self.count + self.block - 1) // self.block if self.block else -1
+            if (
+                self.blocks < 0
+                or self.digests_at != BIN_HEADER.size + self.blocks * BIN_OFFSET.size
+                or self.stats_at != self.digests_at + self.count * self.digest_size
+                or self.paths_at != self.stats_at + self.count * BIN_STAT.size
+                or self.paths_at > len(self.mm)
+            ):
+                raise FicError(f"Truncated or corrupt binary baseline: {path}")
+        except FicError:
+            self.close()
+            raise
+
+    def _block_at(self, b: int) -> int:
+        return self.paths_at + BIN_OFFSET.unpack_from(self.mm, BIN_HEADER.size + b * BIN_OFFSET.size)[0]
+
+    def _head(self, b: int) -> bytes:
+        n, pos = read_varint(self.mm, self._block_at(b))
+        return self.mm[pos : pos + n]
+
+    def _names(self, b: int) -> Iterator[bytes]:
+        """Decode the (encoded) paths of block b."""
+        pos = self._block_at(b)
+        n, pos = read_varint(self.mm, pos)
+        name = self.mm[pos : pos + n]
+        pos += n
+        yield name
+        for _ in range(min(self.block, self.count - b * self.block) - 1):
+            shared, pos = read_varint(self.mm, pos)
+            n, pos = read_varint(self.mm, pos)
+            name = name[:shared] + self.mm[pos : pos + n]
+            pos += n
+            yield name
+
+    def find(self, path: str) -> Optional[int]:
+        """Index of `path`, or None."""
+        key = path.encode("utf-8", "surrogatepass")
+        # Last block whose first path is <= key
+        lo, hi = 0, self.blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._head(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        for i, name in enumerate(self._names(lo - 1)):
+            if name == key:
+                return (lo - 1) * self.block + i
+            if name > key:
+                break
+        return None
+
+    def digest(self, i: int) -> str:
+        flags = self.mm[self.stats_at + i * BIN_STAT.size]
+        if flags & 0x03:
+            return MARKERS[(flags & 0x03) - 1]
+        pos = self.digests_at + i * self.digest_size
+        parts = []
+        for size in self.sizes:
+            parts.append(self.mm[pos : pos + size].hex())
+            pos += size
+        return ":".join(parts)
+
+    def stat(self, i: int) -> Optional[StatKey]:
+        flags, *key = BIN_STAT.unpack_from(self.mm, self.stats_at + i * BIN_STAT.size)
+        return tuple(key) if flags & BIN_HAS_STAT else None  # type: ignore[return-value]
+
+    def __iter__(self) -> Iterator[Record]:
+        for b in range(self.blocks):
+            for i, name in enumerate(self._names(b), b * self.block):
+                yield Record(name.decode("utf-8", "surrogatepass"), self.digest(i), self.stat(i))
+
+    def close(self) -> None:
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.f.close()
+
+
+class BinaryStore(TextStore):
+    """Baseline and last scan as binary tables (db/baseline.fic), sorted by path.
+
+    Digests are stored raw (32 bytes for SHA-256 instead of 64 hex characters),
+    stat data as fixed-width records and paths front-coded. Nothing is parsed
+    up front: the file is mmap'ed and looked up by binary search, so loading a
+    baseline costs the same for 5M entries as for 5. `export` still writes
+    sha256sum text.
+    """
+
+    name = "binary"
+    use_merkle = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._tables: List[BinaryTable] = []
+
+    def hash_files(self, kind: str) -> List[Path]:
+        return [DB_DIR / f"{self.STEMS[kind]}.fic"]
+
+    def table(self, kind: str) -> BinaryTable:
+        table = BinaryTable(self.hash_files(kind)[0], digest_sizes(self.algos))
+        self._tables.append(table)
+        return table
+
+    def baseline_lookup(self) -> Lookup:
+        table = self.table("baseline")
+
+        def lookup(path: str) -> Optional[Tuple[str, Optional[StatKey]]]:
+            i = table.find(path)
+            return (table.digest(i), table.stat(i)) if i is not None else None
+
+        return lookup
+
+    def write(self, kind: str, records: Iterable[Record]) -> Tuple[int, int]:
+        out = self.hash_files(kind)[0]
+        tmp = DB_DIR / f".{kind}_fic_tmp"
+        counts = write_binary_table(sort_records(records), tmp, digest_sizes(self.algos))
+        tmp.replace(out)
+        self.MERKLE[kind].unlink(missing_ok=True)
+        return counts
+
+    def copy_baseline_to_scan(self) -> None:
+        tmp = DB_DIR / ".scan_fic_tmp"
+        shutil.copyfile(self.hash_files("baseline")[0], tmp)
+        tmp.replace(self.hash_files("scan")[0])
+
+    def records(self, kind: str) -> Iterator[Record]:
+        return iter(self.table(kind))
+
+    def changes(self) -> Iterator[Change]:
+        pairs = [((rec.path, rec.digest) for rec in self.records(kind)) for kind in ("baseline", "scan")]
+        return merge_join(*pairs)
+
+    def root(self, kind: str) -> str:
+        return MerkleTree.from_pairs((rec.path, rec.digest) for rec in self.records(kind)).root
+
+    def close(self) -> None:
+        for table in self._tables:
+            table.close()
+        self._tables = []
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind     TEXT NOT NULL,     -- 'baseline' or 'scan'
+    path     TEXT NOT NULL,
+    seq      INTEGER NOT NULL,  -- position in the list, for export
+    digest   TEXT NOT NULL,     -- hex digest or MISSING/ERROR
+    size     INTEGER,
+    mtime_ns INTEGER,
+    ctime_ns INTEGER,
+    ino      INTEGER,
+    dev      INTEGER,
+    PRIMARY KEY (kind, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_seq ON entries (kind, seq);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+ENTRY_COLUMNS = "path, seq, digest, size, mtime_ns, ctime_ns, ino, dev"
+
+
+class SqliteStore:
+    """Baseline, last scan and state in one SQLite database (db/fic.sqlite).
+
+    Checks stay O(changed) in memory: stat lookups are indexed queries and
+    the comparison is a join that only returns rows that differ.
+    """
+
+    name = "sqlite"
+    BATCH = 10000
+
+    def __init__(self, db_file: Path = SQLITE_DB, create: bool = False) -> None:
+        if create:
+            db_file.parent.mkdir(parents=True, exist_ok=True)
+        elif not db_file.exists():
+            # Read-only commands must not leave an empty database behind: look at an empty one
+            db_file = Path(":memory:")
+        self.conn = sqlite3.connect(str(db_file))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.algos: Tuple[str, ...] = tuple(self.load_state().get("algos", DEFAULT_ALGOS))
+
+    def has_baseline(self) -> bool:
+        row = self.conn.execute("SELECT 1 FROM entries WHERE kind = 'baseline' LIMIT 1").fetchone()
+        return row is not None
+
+    def baseline_lookup(self) -> Lookup:
+        cur = self.conn.cursor()
+
+        def lookup(path: str) -> Optional[Tuple[str, Optional[StatKey]]]:
+            row = cur.execute(
+                "SELECT digest, size, mtime_ns, ctime_ns, ino, dev FROM entries"
+                " WHERE kind = 'baseline' AND path = ?",
+                (path,),
+            ).fetchone()
+            if row is None:
+                return None
+            return row[0], (tuple(row[1:]) if row[1] is not None else None)  # type: ignore[return-value]
+
+        return lookup
+
+    def write(self, kind: str, records: Iterable[Record]) -> Tuple[int, int]:
+        """Replace all rows of `kind` in one transaction, upserting in batches."""
+        sql = (
+            f"INSERT INTO entries (kind, {ENTRY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (kind, path) DO UPDATE SET seq = excluded.seq, digest = excluded.digest,"
+            " size = excluded.size, mtime_ns = excluded.mtime_ns, ctime_ns = excluded.ctime_ns,"
+            " ino = excluded.ino, dev = excluded.dev"
+        )
+        total = reused = 0
+        batch: list[tuple] = []
+        with self.conn:
+            self.conn.execute("DELETE FROM entries WHERE kind = ?", (kind,))
+            for rec in records:
+                batch.append((kind, rec.path, total, rec.digest, *(rec.stat or (None,) * 5)))
+                total += 1
+                reused += rec.cached
+                if len(batch) >= self.BATCH:
+                    self.conn.executemany(sql, batch)
+                    batch.clear()
+            if batch:
+                self.conn.executemany(sql, batch)
+        return total, reused
+
+    def copy_baseline_to_scan(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM entries WHERE kind = 'scan'")
+            self.conn.execute(
+                f"INSERT INTO entries (kind, {ENTRY_COLUMNS})"
+                f" SELECT 'scan', {ENTRY_COLUMNS} FROM entries WHERE kind = 'baseline'"
+            )
+
+    def accept(self, paths: Set[str]) -> None:
+        """Copy the last scan rows of `paths` over the baseline, touching only those rows."""
+        with self.conn:
+            for path in paths:
+                self.conn.execute("DELETE FROM entries WHERE kind = 'baseline' AND path = ?", (path,))
+                self.conn.execute(
+                    f"INSERT INTO entries (kind, {ENTRY_COLUMNS})"
+                    f" SELECT 'baseline', {ENTRY_COLUMNS} FROM entries WHERE kind = 'scan' AND path = ?"
+                    f" AND digest NOT IN ({', '.join(repr(m) for m in MARKERS)})",
+                    (path,),
+                )
+
+    def records(self, kind: str) -> Iterator[Record]:
+        cur = self.conn.execute(
+            "SELECT path, digest, size, mtime_ns, ctime_ns, ino, dev FROM entries"
+            " WHERE kind = ? ORDER BY seq",
+            (kind,),
+        )
+        for row in cur:
+            yield Record(row[0], row[1], tuple(row[2:]) if row[2] is not None else None)  # type: ignore[arg-type]
+
+    def changes(self) -> Iterator[Change]:
+        cur = self.conn.execute(
+            "SELECT b.path, b.digest, s.digest FROM entries b"
+            " LEFT JOIN entries s ON s.kind = 'scan' AND s.path = b.path"
+            " WHERE b.kind = 'baseline'"
+            f" AND (s.digest IS NULL OR s.digest IN ({', '.join(repr(m) for m in MARKERS)}) OR s.digest != b.digest)"
+            " ORDER BY b.path"
+        )
+        for path, bhash, shash in cur:
+            yield Change(classify(bhash, shash) or "MODIFIED", path, bhash, shash)
+
+        cur = self.conn.execute(
+            "SELECT s.path, s.digest FROM entries s WHERE s.kind = 'scan' AND NOT EXISTS"
+            " (SELECT 1 FROM entries b WHERE b.kind = 'baseline' AND b.path = s.path)"
+            " ORDER BY s.path"
+        )
+        for path, shash in cur:
+            yield Change("NEW", path, None, shash)
 
+    def root(self, kind: str) -> str:
+        return MerkleTree.from_pairs((rec.path, rec.digest) for rec in self.records(kind)).root
 
-def die(message: str, code: int = 1) -> None:
-    log(f"ERROR: {message}")
-    raise SystemExit(code)
+    def load_state(self) -> dict:
+        return {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM meta")}
 
+    def save_state(self, state: dict) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                [(k, json.dumps(v)) for k, v in state.items()],
+            )
 
-def ensure_default_list() -> None:
-    if DEFAULT_LIST.exists():
-        return
+    def close(self) -> None:
+        self.conn.close()
 
-    DEFAULT_LIST.write_text(
-        "\n".join(
-            [
-                "# One file per line.",
-                "# Lines starting with # are comments (ignored).",
-                "# This default list is project-local, so it works on Windows/Linux.",
-                "# You can add absolute paths (or relative ones if you prefer).",
-                "",
-                "# This script file:",
-                str(PROJECT_DIR / "fic.py"),
-                "",
-                "# Optional: track this list file too:",
-                str(DEFAULT_LIST),
-                "",
-            ]
-        ),
-        encoding="utf-8",
-    )
 
-    log(f"Created default list: {DEFAULT_LIST}")
-    log("Edit it if needed, then run: python fic.py init")
+HISTORY_DIR = DB_DIR / "history"
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id       INTEGER PRIMARY KEY,
+    ts       TEXT NOT NULL,     -- local time, YYYY-mm-dd HH:MM:SS
+    kind     TEXT NOT NULL,     -- init or check
+    entries  INTEGER NOT NULL,
+    changes  INTEGER NOT NULL,  -- rows in `changes` for this scan
+    snapshot TEXT               -- file in db/history/ with the full state after this scan
+);
+CREATE INDEX IF NOT EXISTS scans_ts ON scans (ts);
+CREATE TABLE IF NOT EXISTS changes (
+    path   TEXT NOT NULL,
+    scan   INTEGER NOT NULL,
+    digest TEXT,                -- hex digest or marker, NULL = no longer in the list
+    PRIMARY KEY (path, scan)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS changes_scan ON changes (scan);
+CREATE TABLE IF NOT EXISTS current (
+    path   TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+# Write a full snapshot once the changes since the last one exceed this share of the list,
+# so rebuilding any past state reads at most one snapshot plus that many change rows
+HISTORY_SNAPSHOT_RATIO = 0.5
 
 
-def iter_list_paths(listfile: Path) -> Iterable[str]:
-    """Read paths from the list file (skip empty lines and comments)."""
-    try:
-        text = listfile.read_text(encoding="utf-8")
-    except FileNotFoundError:
-        die(f"List file not found: {listfile}")
+def history_delta(
+    prev: Iterable[Tuple[str, str]], scan: Iterable[Tuple[str, str]], counts: List[int]
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """Merge-join two sorted (path, digest) streams: (path, new digest or None if gone) per difference.
 
-    for raw in text.splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#"):
+    Unlike merge_join() a marker is only a change when it differs from the
+    previous scan, so a file that stays MISSING is recorded once. counts[0]
+    ends up as the number of scan entries.
+    """
+    prev, scan = iter(prev), iter(scan)
+    p, s = next(prev, None), next(scan, None)
+    while p is not None or s is not None:
+        if s is None or (p is not None and p[0] < s[0]):
+            yield p[0], None  # type: ignore[index]
+            p = next(prev, None)
             continue
-        # Support ~/ at the start
-        if line.startswith("~/"):
-            line = str(Path.home() / line[2:])
-        yield line
+        counts[0] += 1
+        if p is None or s[0] < p[0]:
+            yield s
+        else:
+            if p[1] != s[1]:
+                yield s
+            p = next(prev, None)
+        s = next(scan, None)
 
 
-def sha256_of_file(path: Path) -> str:
-    """Return SHA-256 hex digest for the given file."""
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+class History:
+    """Every scan as a delta against the previous one (db/history/index.sqlite).
 
+    `changes` holds one row per path whose digest changed, indexed by path
+    (when did X change) and by scan. `current` is the state after the last
+    scan, which each new scan is merge-joined against. Full snapshots
+    (gzip'ed sha256sum text) are only written after enough changes piled
+    up, so storage grows with the number of changes, not with the number
+    of scans times the list size.
+    """
 
-def hash_files_from_list(listfile: Path, out_file: Path) -> None:
-    out_file.parent.mkdir(parents=True, exist_ok=True)
+    def __init__(self, root: Path = HISTORY_DIR) -> None:
+        self.root = root
+        self.conn = sqlite3.connect(str(root / "index.sqlite"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(HISTORY_SCHEMA)
 
-    lines: list[str] = []
-    for p in iter_list_paths(listfile):
-        path = Path(p)
-        if path.is_file():
-            try:
-                digest = sha256_of_file(path)
-                # Same format as sha256sum: "<hash>  <path>"
-                lines.append(f"{digest}  {p}")
-            except OSError:
-                lines.append(f"ERROR  {p}")
-        else:
-            lines.append(f"MISSING  {p}")
+    @staticmethod
+    def enabled() -> bool:
+        return HISTORY_DIR.is_dir()
 
-    out_file.write_text("\n".join(lines) + ("\n" if lines else ""), encoding="utf-8")
+    @classmethod
+    def create(cls) -> "History":
+        HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+        return cls()
 
+    def record(self, records: Iterable[Record], kind: str) -> Tuple[int, int]:
+        """Add one scan; return (its id, number of changed paths)."""
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cur = self.conn.cursor()
+        with self.conn:
+            scan = cur.execute(
+                "INSERT INTO scans (ts, kind, entries, changes) VALUES (?, ?, 0, 0)", (ts, kind)
+            ).lastrowid
+            prev = self.conn.execute("SELECT path, digest FROM current ORDER BY path")
+            pairs = ((rec.path, rec.digest) for rec in sort_records(records))
+            counts = [0]
+            changed = 0
+            batch: List[tuple] = []
+            for path, digest in history_delta(prev, pairs, counts):
+                batch.append((path, scan, digest))
+                if len(batch) >= SqliteStore.BATCH:
+                    cur.executemany("INSERT INTO changes (path, scan, digest) VALUES (?, ?, ?)", batch)
+                    changed += len(batch)
+                    batch.clear()
+            cur.executemany("INSERT INTO changes (path, scan, digest) VALUES (?, ?, ?)", batch)
+            changed += len(batch)
+            entries = counts[0]
 
-def parse_hash_file(hash_file: Path) -> Dict[str, str]:
-    """Parse a baseline/scan file into a dict: path -> hash/marker."""
-    if not hash_file.exists():
-        die(f"File not found: {hash_file}")
+            cur.execute(
+                "INSERT OR REPLACE INTO current (path, digest)"
+                " SELECT path, digest FROM changes WHERE scan = ? AND digest IS NOT NULL",
+                (scan,),
+            )
+            cur.execute(
+                "DELETE FROM current WHERE path IN (SELECT path FROM changes WHERE scan = ? AND digest IS NULL)",
+                (scan,),
+            )
+            last = cur.execute("SELECT COALESCE(MAX(id), 0) FROM scans WHERE snapshot IS NOT NULL").fetchone()[0]
+            since = cur.execute("SELECT COALESCE(SUM(changes), 0) FROM scans WHERE id > ?", (last,)).fetchone()[0]
+            snapshot = None
+            if not last or since + changed > entries * HISTORY_SNAPSHOT_RATIO:
+                snapshot = f"{scan:08d}.snapshot.gz"
+                self._write_snapshot(snapshot)
+            cur.execute(
+                "UPDATE scans SET entries = ?, changes = ?, snapshot = ? WHERE id = ?",
+                (entries, changed, snapshot, scan),
+            )
+        return scan, changed
 
-    mapping: Dict[str, str] = {}
-    for raw in hash_file.read_text(encoding="utf-8").splitlines():
-        line = raw.rstrip("\r\n")
-        if not line:
-            continue
-        # Split once: first token is hash/marker, the rest is the path
-        parts = line.split(maxsplit=1)
-        if len(parts) != 2:
-            continue
-        h, path = parts[0], parts[1].lstrip(" *")
-        mapping[path] = h
-    return mapping
+    def _write_snapshot(self, name: str) -> None:
+        tmp = self.root / f".{name}_tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for path, digest in self.conn.execute("SELECT path, digest FROM current ORDER BY path"):
+                f.write(f"{digest}  {path}\n")
+        tmp.replace(self.root / name)
+
+    def scans(self) -> List[tuple]:
+        return self.conn.execute("SELECT id, ts, kind, entries, changes, snapshot FROM scans ORDER BY id").fetchall()
+
+    def scan_at(self, at: str) -> Optional[int]:
+        """Id of the last scan at or before `at` (a timestamp prefix, so a date means its end)."""
+        row = self.conn.execute("SELECT MAX(id) FROM scans WHERE substr(ts, 1, ?) <= ?", (len(at), at)).fetchone()
+        return row[0]
+
+    def path_changes(self, path: str) -> List[Tuple[str, Optional[str]]]:
+        """(ts, digest) of every scan in which `path` changed, oldest first."""
+        return self.conn.execute(
+            "SELECT s.ts, c.digest FROM changes c JOIN scans s ON s.id = c.scan WHERE c.path = ? ORDER BY c.scan",
+            (path,),
+        ).fetchall()
+
+    def digest_at(self, path: str, scan: int) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT digest FROM changes WHERE path = ? AND scan <= ? ORDER BY scan DESC LIMIT 1", (path, scan)
+        ).fetchone()
+        return row[0] if row else None
+
+    def state_at(self, scan: int) -> Iterator[Tuple[str, str]]:
+        """(path, digest) after `scan`, sorted: its snapshot plus the changes since."""
+        snap, name = self.conn.execute(
+            "SELECT id, snapshot FROM scans WHERE id <= ? AND snapshot IS NOT NULL ORDER BY id DESC LIMIT 1",
+            (scan,),
+        ).fetchone() or (0, None)
+        base = self._snapshot_pairs(name) if name else iter(())
+        rows = self.conn.execute(
+            "SELECT path, digest FROM changes WHERE scan > ? AND scan <= ? ORDER BY path, scan", (snap, scan)
+        )
+        # Last change per path wins; a NULL digest drops the path
+        delta = dedupe_sorted(rows)
+        b, d = next(base, None), next(delta, None)
+        while b is not None or d is not None:
+            if d is None or (b is not None and b[0] < d[0]):
+                yield b  # type: ignore[misc]
+                b = next(base, None)
+                continue
+            if b is not None and b[0] == d[0]:
+                b = next(base, None)
+            if d[1] is not None:
+                yield d
+            d = next(delta, None)
+
+    def _snapshot_pairs(self, name: str) -> Iterator[Tuple[str, str]]:
+        with gzip.open(self.root / name, "rt", encoding="utf-8") as f:
+            for raw in f:
+                parsed = parse_hash_line(raw)
+                if parsed:
+                    yield parsed
+
+    def close(self) -> None:
+        self.conn.close()
 
 
-def cmd_init(listfile: Path) -> None:
+STORES = ("auto", "text", "sorted", "binary", "sqlite")
+
+
+def open_store(name: str = "auto", create: bool = False):
+    """Open the baseline store.
+
+    "auto" uses the store the last init/import recorded in db/state.json
+    (SQLite for older setups that only have db/fic.sqlite, else text).
+    Only `create` (init/import) makes a new SQLite database.
+    """
+    if name == "auto":
+        name = load_state().get("store") or ("sqlite" if SQLITE_DB.exists() else "text")
+    if name == "sqlite":
+        return SqliteStore(create=create)
+    if name == "sorted":
+        return SortedTextStore()
+    if name == "binary":
+        return BinaryStore()
+    return TextStore()
+
+
+def record_store(store) -> None:
+    """Remember in db/state.json which store `auto` means from now on."""
+    if store.name == "sqlite":
+        # The SQLite store keeps its state in the database, but `auto` reads state.json
+        save_state(dict(load_state(), store=store.name))
+
+
+def cmd_init(
+    listfile: Path,
+    jobs: int = 1,
+    store_name: str = "auto",
+    opts: HashOptions = HashOptions(),
+    history: bool = False,
+) -> None:
     if listfile == DEFAULT_LIST and not listfile.exists():
         ensure_default_list()
 
     if not listfile.exists():
         die(f"List file not found: {listfile}")
 
-    tmp = DB_DIR / ".baseline_tmp"
-    hash_files_from_list(listfile, tmp)
+    store = open_store(store_name, create=True)
+    store.algos = opts.algos
+    entries = TIMER.iter("list", iter_watch_entries(listfile))
+    with TIMER.phase("write"):
+        store.write("baseline", TIMER.iter("hash", hash_paths(entries, jobs, opts=opts)))
+        store.copy_baseline_to_scan()
 
-    DB_DIR.mkdir(parents=True, exist_ok=True)
-    tmp.replace(BASELINE)
-    # Keep last_scan equal to baseline (simple copy)
-    LAST_SCAN.write_text(BASELINE.read_text(encoding="utf-8"), encoding="utf-8")
+    state = store.load_state()
+    state["checks"] = 0
+    state["store"] = store.name
+    state["algos"] = list(opts.algos)
+    state["baseline_version"] = time.time_ns()
+    store.save_state(state)
+    record_store(store)
+    if history:
+        History.create().close()
+    record_history(store, "baseline", "init")
+    store.close()
 
-    log(f"Baseline created: {BASELINE}")
+    where = SQLITE_DB if store.name == "sqlite" else ", ".join(str(f) for f in store.hash_files("baseline"))
+    log(f"Baseline created ({'+'.join(opts.algos)}): {where}")
     log(f"List used: {listfile}")
+    if opts.dedup and opts.dedup.avoided:
+        log(opts.dedup.summary())
+    if opts.budget:
+        log(opts.budget.summary())
+
+
+def record_history(store, kind: str, label: str) -> None:
+    """Add the store's baseline/last scan to db/history/ if history is on."""
+    if not History.enabled():
+        return
+    history = History()
+    with TIMER.phase("history"):
+        scan, changed = history.record(store.records(kind), label)
+    history.close()
+    log(f"History: scan #{scan} recorded, {changed} path(s) changed since the previous one")
 
 
 def cmd_add(path: str, listfile: Path) -> None:
@@ -175,60 +2924,1076 @@ def cmd_remove(path: str, listfile: Path) -> None:
     log(f"Removed from list: {path}")
 
 
-def cmd_check(listfile: Path) -> None:
+def cmd_check(
+    listfile: Path,
+    jobs: int = 1,
+    paranoid: bool = False,
+    full_every: int = DEFAULT_FULL_EVERY,
+    store_name: str = "auto",
+    opts: HashOptions = HashOptions(),
+    resume: bool = False,
+    rolling: int = 0,
+    baseline: Optional[Lookup] = None,
+    output: Optional[str] = None,
+    alerts: Iterable[str] = (),
+) -> None:
     if not listfile.exists():
         die(f"List file not found: {listfile}")
-    if not BASELINE.exists():
+
+    store = open_store(store_name)
+    if not store.has_baseline():
         die("Baseline not found. Run: python fic.py init")
 
-    tmp = DB_DIR / ".scan_tmp"
-    hash_files_from_list(listfile, tmp)
-    DB_DIR.mkdir(parents=True, exist_ok=True)
-    tmp.replace(LAST_SCAN)
+    state = store.load_state()
+    # Hash with the algorithms recorded for this baseline
+    opts = opts._replace(algos=store.algos)
+    sinks: List[Any] = [EventSink(output)] if output else []
+    sinks += [open_alert_sink(spec) for spec in alerts]
 
-    log("Scan complete. Comparing with baseline...")
+    # A check picks up a checkpoint only with --resume and only for the same list/store/algorithms
+    scan = {"list": str(listfile.resolve()), "store": store.name, "algos": list(store.algos)}
+    cp = ScanJournal.load()
+    if cp and not resume:
+        log(f"Discarding an interrupted check ({cp['count']} entries done), use --resume to continue such runs")
+        cp = None
+    elif resume and not cp:
+        log("Nothing to resume, starting a new check")
+    elif cp and {k: cp.get(k) for k in scan} != scan:
+        log("Checkpoint is for another list, store or algorithm, starting a new check", level="warning")
+        cp = None
 
-    base = parse_hash_file(BASELINE)
-    scan = parse_hash_file(LAST_SCAN)
+    if cp:
+        state["checks"], full, window = cp["checks"], cp["full"], cp.get("rolling")
+    else:
+        state["checks"] = state.get("checks", 0) + 1
+        if rolling:
+            # The rolling slices replace the periodic full rehash
+            full = paranoid
+            prev = state.get("rolling", {})
+            window = None if full else [prev.get("next", 0) if prev.get("n") == rolling else 0, rolling]
+        else:
+            full = paranoid or (full_every > 0 and state["checks"] % full_every == 0)
+            window = None
+        cp = dict(scan, checks=state["checks"], full=full, rolling=window)
+    if window:
+        state["rolling"] = {"n": window[1], "next": (window[0] + 1) % window[1]}
 
-    changes = 0
+    # Stat cache: reuse the baseline digest when size/mtime/ctime/inode/device all match
+    with TIMER.phase("load"):
+        base = (baseline or store.baseline_lookup()) if sinks or not full else None
+        lookup = None if full else base
+    if lookup and window:
+        lookup = rolling_lookup(lookup, *window)
+    entries = TIMER.iter("list", iter_watch_entries(listfile))
+    if cp.get("count"):
+        if not skip_entries(entries, cp["count"], cp["last"]):
+            die("The list changed since the checkpoint, run check without --resume")
+        log(f"Resuming after {cp['count']} entries (last: {cp['last']})")
 
-    # Compare entries from baseline
-    for path, bhash in sorted(base.items()):
-        shash = scan.get(path)
-        if shash is None:
-            log(f"MISSING (not scanned): {path}")
-            changes += 1
-        elif shash == "MISSING":
-            log(f"MISSING: {path}")
-            changes += 1
-        elif shash == "ERROR":
-            log(f"ERROR (could not hash): {path}")
-            changes += 1
-        elif bhash != shash:
-            log(f"MODIFIED: {path}")
-            changes += 1
+    journal = ScanJournal()
+    journal.start(cp)
+    records: Iterable[Record] = itertools.chain(
+        journal.replay(), journal.record(hash_paths(entries, jobs, lookup, opts))
+    )
+    if sinks and base:
+        records = stream_changes(records, base, sinks)
+    with TIMER.phase("write"):
+        total, reused = store.write("scan", TIMER.iter("hash", records))
+        store.save_state(state)
+    journal.finish()
+    record_history(store, "scan", "check")
 
-    # Anything that shows up now but wasn't in baseline
-    for path in sorted(scan.keys() - base.keys()):
-        log(f"NEW (in list now, not in baseline): {path}")
-        changes += 1
+    mode = "full rehash" if full else f"{reused} reused from stat cache"
+    if window:
+        mode += f", rolling slice {window[0] + 1}/{window[1]} rehashed"
+    log(f"Scan complete ({total} entries, {mode}). Comparing with baseline...")
+    if opts.dedup and opts.dedup.avoided:
+        log(opts.dedup.summary())
+    if opts.budget:
+        log(opts.budget.summary())
+
+    with TIMER.phase("compare"):
+        changes = store.changes()
+        count = report_changes(stream_unscanned(changes, sinks) if sinks else changes)
+    for sink in sinks:
+        sink.emit("SCAN_COMPLETE", None, entries=total, changes=count)
+    for sink in sinks:
+        sink.close()
+    store.close()
+
+
+def cmd_export(kind: str, out_path: Optional[str], store_name: str = "auto", algo: Optional[str] = None) -> None:
+    """Write the baseline or last scan in sha256sum-compatible text format (one algorithm)."""
+    store = open_store(store_name)
+    algo = algo or store.algos[0]
+    if algo not in store.algos:
+        die(f"The {kind} has no {algo} digests (it has: {', '.join(store.algos)})")
+    index, n = store.algos.index(algo), len(store.algos)
 
-    if changes == 0:
-        log("OK: No changes detected.")
+    if out_path in (None, "-"):
+        write_sha256sum(store.records(kind), sys.stdout, index, n)
     else:
-        log(f"ALERT: Detected {changes} change(s). See log: {LOG_FILE}")
+        try:
+            f = open(out_path, "w", encoding="utf-8")
+        except OSError as e:
+            store.close()
+            die(f"Can't open {out_path}: {e.strerror}")
+        with f:
+            count = write_sha256sum(store.records(kind), f, index, n)
+        log(f"Exported {count} {kind} {algo} entries to {out_path}")
+    store.close()
+
+
+def cmd_import(hash_file: Path, kind: str, store_name: str = "auto", algo: Optional[str] = None) -> None:
+    """Load a sha256sum-style file (and its .meta sidecar if present) into the store.
+
+    The algorithm comes from --algo or the file suffix (baseline.blake2b), default sha256.
+    """
+    if not hash_file.exists():
+        die(f"File not found: {hash_file}")
+    if algo is None:
+        suffix = hash_file.suffix.lstrip(".").lower()
+        algo = suffix if suffix in hashlib.algorithms_available else "sha256"
+
+    store = open_store(store_name, create=True)
+    if store.algos != (algo,):
+        if store.has_baseline() and kind == "scan":
+            die(f"Baseline uses {'+'.join(store.algos)}, can't import a {algo} scan")
+        store.algos = (algo,)
+        state = store.load_state()
+        state["algos"] = [algo]
+        store.save_state(state)
+    total, _ = store.write(kind, read_hash_records(hash_file))
+    if kind == "baseline":
+        state = store.load_state()
+        state["baseline_version"] = time.time_ns()
+        state["store"] = store.name
+        store.save_state(state)
+        record_store(store)
+    store.close()
+    log(f"Imported {total} {kind} {algo} entries from {hash_file} into {store.name} store")
+
+
+def path_under(path: str, target: str) -> bool:
+    """True if `path` is `target` or lies below it."""
+    return path == target or path.startswith(target.rstrip("/") + "/")
+
+
+def cmd_accept(
+    paths: List[str],
+    all_modified: bool = False,
+    from_last_scan: bool = False,
+    store_name: str = "auto",
+) -> None:
+    """Promote entries of the last scan into the baseline without rehashing anything.
+
+    PATHs (files or directories) take every change under them, --all-modified
+    only MODIFIED entries, --from-last-scan every change. Unreadable entries
+    (ERROR/TIMEOUT) are never accepted.
+    """
+    store = open_store(store_name)
+    if not store.has_baseline():
+        die("Baseline not found. Run: python fic.py init")
+    targets = set(paths) | {os.path.abspath(p) for p in paths}
+
+    accepted: Dict[str, str] = {}
+    matched: Set[str] = set()
+    for change in store.changes():
+        hits = {t for t in targets if path_under(change.path, t)}
+        if not (from_last_scan or hits or (all_modified and change.kind == "MODIFIED")):
+            continue
+        matched |= hits
+        if change.kind in ("ERROR", "TIMEOUT"):
+            log(f"Not accepted, the last scan could not read it: {change.path}", level="warning")
+            continue
+        accepted[change.path] = change.kind
+    for p in paths:
+        if not {p, os.path.abspath(p)} & matched:
+            log(f"Nothing to accept for {p} (unchanged in the last scan or not watched)")
+
+    if not accepted:
+        store.close()
+        log("Baseline unchanged.")
+        return
+    with TIMER.phase("write"):
+        store.accept(set(accepted))
+        state = store.load_state()
+        state["baseline_version"] = time.time_ns()
+        store.save_state(state)
+    store.close()
+    for path, kind in sorted(accepted.items()):
+        log(f"ACCEPTED {kind}: {path}", event="ACCEPTED", kind=kind, path=path)
+    if "MISSING" in accepted.values():
+        log("Accepted MISSING entries left the baseline; `fic.py remove` them from the list too")
+    log(f"Baseline updated: {len(accepted)} entr{'y' if len(accepted) == 1 else 'ies'} accepted from the last scan")
+
+
+def open_hash_source(store, name: str) -> Iterator[Tuple[str, str]]:
+    """`baseline`/`scan` from the store, or any sha256sum-style file."""
+    if name in ("baseline", "scan"):
+        return ((rec.path, rec.digest) for rec in store.records(name))
+    return iter_hash_file(Path(name))
+
+
+def cmd_root(kind: str, store_name: str = "auto") -> None:
+    """Print the Merkle root hash, e.g. to compare hosts before shipping scan files."""
+    store = open_store(store_name)
+    print(store.root(kind))
+    store.close()
+
+
+def cmd_diff(a: str, b: str, store_name: str = "auto") -> None:
+    """Compare two baselines (or scans) by walking their Merkle trees."""
+    store = open_store(store_name)
+    tree_a = MerkleTree.from_pairs(open_hash_source(store, a))
+    tree_b = MerkleTree.from_pairs(open_hash_source(store, b))
+    store.close()
+
+    if tree_a.root == tree_b.root:
+        log(f"OK: {a} and {b} are identical (root {tree_a.root}).")
+        return
+    changes, visited = tree_a.diff(tree_b)
+    log(f"Merkle tree: compared {visited} of {len(tree_a.nodes)} directories.")
+    report_changes(changes)
+
+
+# inotify(7) constants
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (then the name)
+# Wait this long after the last event before rehashing, so bursts of writes are hashed once
+WATCH_SETTLE = 0.5
+
+
+class Inotify:
+    """Minimal inotify binding through ctypes (Linux only, nothing to install)."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, str] = {}
+
+    def add_dir(self, path: str) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.dirs[wd] = path
+
+    def remove_tree(self, path: str) -> None:
+        """Stop watching `path` and the directories below it (it was moved away)."""
+        prefix = os.path.join(path, "")
+        for wd, d in list(self.dirs.items()):
+            if d == path or d.startswith(prefix):
+                self._rm_watch(self.fd, wd)  # already gone if the directory was deleted
+                del self.dirs[wd]
+
+    def read(self, timeout: Optional[float]) -> Iterator[Tuple[str, int]]:
+        """Yield (path, mask) for the events that arrive within `timeout` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        buf = os.read(self.fd, 64 * 1024)
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _cookie, size = INOTIFY_EVENT.unpack_from(buf, pos)
+            pos += INOTIFY_EVENT.size
+            name = os.fsdecode(buf[pos:pos + size].rstrip(b"\0"))
+            pos += size
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            base = self.dirs.get(wd)
+            if base is not None or mask & IN_Q_OVERFLOW:
+                yield (os.path.join(base, name) if base and name else base or ""), mask
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def cmd_watch(listfile: Path, store_name: str = "auto", alerts: Iterable[str] = ()) -> None:
+    """Rehash watched files as soon as inotify reports a write/attribute change/move."""
+    if not sys.platform.startswith("linux"):
+        die("watch needs Linux inotify")
+    if not listfile.exists():
+        die(f"List file not found: {listfile}")
+
+    store = open_store(store_name)
+    if not store.has_baseline():
+        die("Baseline not found. Run: python fic.py init")
+    lookup = store.baseline_lookup()
+    opts = HashOptions(algos=store.algos)
+    sinks = [open_alert_sink(spec) for spec in alerts]
+    watched = compile_list_matcher(listfile)
+    includes, excluded = read_list(listfile)
+    # New subdirectories under these are watched too
+    recursive = [to_slash(dir_entry_top(line)).rstrip("/") + "/" for line in includes if is_dir_entry(line)]
+    recursive += [to_slash(line.split("**")[0]) for line in includes if "**" in line]
+
+    # Watch parent directories, not files: that also catches editors that
+    # replace a file by renaming a temp file over it. Every directory a
+    # directory entry or glob can reach is watched, even one that holds no
+    # watched file yet.
+    known = {entry.path for entry in iter_watch_entries(listfile)}
+    dirs = {os.path.dirname(p) or "." for p in known}
+    for line in includes:
+        if GLOB_CHARS.search(line):
+            dirs.update(walk_dirs(*glob_top(line), excluded))
+        elif is_dir_entry(line) and not excluded(dir_entry_top(line) + "/"):
+            dirs.update(walk_dirs(dir_entry_top(line), -1, excluded))
+    inotify = Inotify()
+    for d in sorted(dirs):
+        try:
+            inotify.add_dir(d)
+        except OSError as e:
+            log(f"WARNING: cannot watch {d}: {e.strerror}", level="warning")
+    log(f"Watching {len(inotify.dirs)} directories from {listfile}. Ctrl+C to stop.")
+
+    # Last state reported per path, so one change is not reported over and over
+    reported: Dict[str, Optional[str]] = {}
+    dirty: Dict[str, None] = {}
+    try:
+        while True:
+            got_event = False
+            for path, mask in inotify.read(WATCH_SETTLE if dirty else None):
+                got_event = True
+                if mask & IN_Q_OVERFLOW:
+                    log("WARNING: inotify queue overflowed, some events were lost. Run: python fic.py check", level="warning")
+                    continue
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and any(to_slash(path).startswith(r) for r in recursive):
+                        # Watch the new tree, then hash what is in it already (moved in, or
+                        # created before the watch was added)
+                        for d in walk_dirs(path, -1, excluded):
+                            try:
+                                inotify.add_dir(d)
+                            except OSError:
+                                pass
+                        dirty.update(dict.fromkeys(e.path for e in scan_tree(path, -1, excluded) if watched(e.path)))
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        # The files below a removed or moved-away directory are gone from their paths
+                        inotify.remove_tree(path)
+                        prefix = os.path.join(path, "")
+                        dirty.update(dict.fromkeys(p for p in known if p.startswith(prefix)))
+                    continue
+                if watched(path):
+                    if is_utf8(path):
+                        dirty[path] = None
+                    else:
+                        warn_not_utf8(path)
+            if got_event or not dirty:
+                continue
+
+            known.update(dirty)
+            for path in dirty:
+                base = lookup(path)
+                rec = hash_entry(path, opts=opts)
+                kind = classify(base[0] if base else None, rec.digest)
+                if kind == "NEW" and rec.digest == "MISSING":
+                    kind = None  # created and removed again, never in the baseline
+                state = rec.digest if kind else None
+                if reported.get(path) != state:
+                    if kind:
+                        log(f"{CHANGE_MESSAGES[kind]}: {path}", level="alert", event=kind, path=path, new=rec.digest)
+                    elif path in reported:
+                        log(f"RESTORED (matches baseline again): {path}", event="RESTORED", path=path)
+                    for sink in sinks:
+                        sink.emit(kind or "RESTORED", path, base[0] if base else None, rec.digest)
+                    reported[path] = state
+            dirty.clear()
+            LOGGER.flush()
+    except KeyboardInterrupt:
+        log("Watch stopped.")
+    finally:
+        inotify.close()
+        store.close()
+        for sink in sinks:
+            sink.close()
+
+
+def cmd_history(path: Optional[str], at: Optional[str], out_path: Optional[str]) -> None:
+    """List recorded scans, the changes of one path, or the tree as it was at a time."""
+    if not History.enabled():
+        die("No history kept. Start it with: python fic.py init --history")
+    history = History()
+    try:
+        if path is not None:
+            # Paths are recorded as written in the list, usually absolute
+            if not history.path_changes(path):
+                path = os.path.abspath(path)
+        if at is not None:
+            at = normalize_ts(at)
+            scan = history.scan_at(at)  # type: ignore[arg-type]
+            if scan is None:
+                die(f"No scan recorded at or before {at}")
+            if path is not None:
+                print(f"{history.digest_at(path, scan) or 'NOT IN LIST'}  {path}")
+            elif out_path in (None, "-"):
+                write_sha256sum((Record(p, d) for p, d in history.state_at(scan)), sys.stdout)
+            else:
+                try:
+                    f = open(out_path, "w", encoding="utf-8")
+                except OSError as e:
+                    die(f"Can't open {out_path}: {e.strerror}")
+                with f:
+                    count = write_sha256sum((Record(p, d) for p, d in history.state_at(scan)), f)
+                log(f"Wrote {count} entries as of scan #{scan} to {out_path}")
+        elif path is not None:
+            rows = history.path_changes(path)
+            if not rows:
+                print(f"No changes recorded for {path}")
+            for ts, digest in rows:
+                print(f"{ts}  {digest or 'REMOVED FROM LIST'}")
+        else:
+            for scan, ts, kind, entries, changes, snapshot in history.scans():
+                print(f"#{scan}  {ts}  {kind:<5}  {entries} entries  {changes} changed{'  (snapshot)' if snapshot else ''}")
+    finally:
+        history.close()
+
+
+def normalize_ts(value: Optional[str]) -> Optional[str]:
+    """Accept "YYYY-mm-dd", "YYYY-mm-dd HH:MM[:SS]" or ISO "T" forms."""
+    if not value:
+        return None
+    value = value.strip().replace("T", " ")
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            datetime.strptime(value, fmt)
+            return value
+        except ValueError:
+            pass
+    die(f"Bad timestamp (use YYYY-mm-dd[ HH:MM[:SS]]): {value}")
+    return None
+
+
+def iter_log_lines(since: Optional[str], until: Optional[str]) -> Iterator[str]:
+    """Yield log lines with since <= ts <= until, oldest first.
+
+    A bound is a timestamp prefix, so --until 2024-05-14 includes that whole day.
+    Segments are picked by binary search over the index, and inside a segment
+    only the gzip members from the first matching block on are decompressed.
+    The active log is searched directly by byte offset.
+    """
+
+    def after_until(t: str) -> bool:
+        return until is not None and t[: len(until)] > until
+
+    segments = load_log_index()
+    start = bisect.bisect_left([seg["last"] for seg in segments], since) if since else 0
+    for seg in segments[start:]:
+        if after_until(seg["first"]):
+            return
+        path = LOG_DIR / seg["file"]
+        if not path.exists():
+            continue
+        firsts = [b[0] for b in seg["blocks"]]
+        block = max(0, bisect.bisect_left(firsts, since) - 1) if since else 0
+        with path.open("rb") as raw:
+            raw.seek(seg["blocks"][block][1] if seg["blocks"] else 0)
+            with gzip.open(raw, "rt", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    t = line_ts(line) or ""
+                    if since and t < since:
+                        continue
+                    if after_until(t):
+                        return
+                    yield line
+
+    index = SortedLineIndex(LOG_FILE, lambda line: (line_ts(line) or "", None))
+    try:
+        for line in index.lines_from(index.lower_bound(since) if since else 0):
+            if after_until(line_ts(line) or ""):
+                return
+            yield line
+    finally:
+        index.close()
+
+
+def cmd_log(since: Optional[str], until: Optional[str], path: Optional[str]) -> None:
+    """Print log lines from a time range, across rotated segments and the active log."""
+    LOGGER.flush()
+    since, until = normalize_ts(since), normalize_ts(until)
+    for line in iter_log_lines(since, until):
+        if path is None or path in line:
+            sys.stdout.write(line if line.endswith("\n") else line + "\n")
+
+
+class Modified(NamedTuple):
+    path: str
+    old: str
+    new: str
+
+
+class Missing(NamedTuple):
+    path: str
+    old: str
+    listed: bool = True  # False: in the baseline but no longer in the list, so not scanned
+
+
+class New(NamedTuple):
+    path: str
+    new: str  # digest, or MISSING if the listed file does not exist either
+
+
+class Error(NamedTuple):
+    path: str
+    old: Optional[str]
+    reason: str  # ERROR or TIMEOUT
+
+
+Event = Union[Modified, Missing, New, Error]
+
+
+def change_event(change: Change) -> Event:
+    """Turn a Change (as the stores report it) into a typed event."""
+    if change.kind == "MODIFIED":
+        return Modified(change.path, change.old or "", change.new or "")
+    if change.kind in ("MISSING", "UNSCANNED"):
+        return Missing(change.path, change.old or "", listed=change.kind == "MISSING")
+    if change.kind == "NEW":
+        return New(change.path, change.new or "")
+    return Error(change.path, change.old, change.kind)
+
+
+class Baseline:
+    """A baseline held in memory: path -> (digest, stat data).
+
+    Usable as a stat cache lookup (`baseline.get`), e.g. by Scanner or `serve`.
+    """
+
+    def __init__(
+        self,
+        entries: Dict[str, Tuple[str, Optional[StatKey]]],
+        algos: Tuple[str, ...] = DEFAULT_ALGOS,
+        store: str = "",
+        version: Optional[int] = None,
+    ) -> None:
+        self.entries = entries
+        self.algos = algos
+        self.store = store
+        self.version = version
+
+    @classmethod
+    def load(cls, store_name: str = "auto", required: bool = True) -> "Baseline":
+        """Read the baseline of a store (the one in this folder's db/)."""
+        store = open_store(store_name)
+        try:
+            if not store.has_baseline():
+                if required:
+                    raise FicError("Baseline not found. Run: python fic.py init")
+                records: Iterable[Record] = ()
+            else:
+                records = store.records("baseline")
+            try:
+                entries = {rec.path: (rec.digest, rec.stat) for rec in records}
+            except (struct.error, IndexError, UnicodeDecodeError) as e:
+                raise FicError(f"Corrupt baseline in the {store.name} store: {e}") from None
+            return cls(entries, store.algos, store.name, store.load_state().get("baseline_version"))
+        finally:
+            store.close()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Record], algos: Tuple[str, ...] = DEFAULT_ALGOS) -> "Baseline":
+        return cls({rec.path: (rec.digest, rec.stat) for rec in records}, algos)
+
+    def get(self, path: str) -> Optional[Tuple[str, Optional[StatKey]]]:
+        return self.entries.get(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self.entries
+
+
+class Scanner:
+    """Hash a list (or any paths) and stream the differences to a Baseline.
+
+        baseline = Baseline.load()
+        for event in Scanner(baseline, listfile=Path("critical_files.txt")).events():
+            if isinstance(event, Modified):
+                ...
+
+    Events come out while the scan runs, in list order; with a list file,
+    baseline entries that are not in it any more follow as Missing(listed=False).
+    Nothing is logged or written to db/, and errors raise FicError.
+    `records()` gives every hashed Record instead, e.g. to build a Baseline.
+    """
+
+    def __init__(
+        self,
+        baseline: Optional[Baseline] = None,
+        listfile: Optional[Path] = None,
+        paths: Optional[Iterable[str]] = None,
+        jobs: int = DEFAULT_JOBS,
+        opts: Optional[HashOptions] = None,
+        stat_cache: bool = True,
+    ) -> None:
+        if (listfile is None) == (paths is None):
+            raise FicError("Give either a list file or paths")
+        if listfile is not None and not listfile.exists():
+            raise FicError(f"List file not found: {listfile}")
+        if jobs < 1:
+            raise FicError("jobs must be at least 1")
+        self.baseline = baseline
+        self.listfile = listfile
+        self.paths = paths
+        self.jobs = jobs
+        algos = baseline.algos if baseline is not None else DEFAULT_ALGOS
+        self.opts = (opts or HashOptions())._replace(algos=algos)
+        self.stat_cache = stat_cache
+
+    def records(self) -> Iterator[Record]:
+        if self.listfile is not None:
+            entries: Iterable[WatchEntry] = iter_watch_entries(self.listfile)
+        else:
+            entries = (WatchEntry(p) for p in self.paths or ())
+        lookup = self.baseline.get if self.baseline is not None and self.stat_cache else None
+        return hash_paths(entries, self.jobs, lookup, self.opts)
+
+    def events(self) -> Iterator[Event]:
+        if self.baseline is None:
+            raise FicError("events() needs a baseline to compare with")
+        seen = set()
+        for rec in self.records():
+            seen.add(rec.path)
+            base = self.baseline.get(rec.path)
+            kind = classify(base[0] if base else None, rec.digest)
+            if kind:
+                yield change_event(Change(kind, rec.path, base[0] if base else None, rec.digest))
+        if self.listfile is None:
+            return  # explicit paths are a spot check, the rest of the baseline is not "gone"
+        for path, (digest, _) in self.baseline.entries.items():
+            if path not in seen:
+                yield Missing(path, digest, listed=False)
+
+    __iter__ = events
+
+
+def verify_path(path: str, base: Optional[Tuple[str, Optional[StatKey]]], opts: HashOptions) -> Tuple[str, str]:
+    """Compare one file with its baseline entry: (OK or the change kind, how it was checked)."""
+    if base is None:
+        return "NEW", ""
+    rec = hash_entry(path, base, opts=opts)
+    kind = classify(base[0], rec.digest)
+    return kind or "OK", "stat cache" if rec.cached else "hashed"
+
+
+def report_verify(path: str, kind: str, how: str) -> int:
+    if kind == "OK":
+        LOGGER.echo(f"OK: {path} ({how})")
+        return 0
+    if kind == "NEW":
+        LOGGER.echo(f"NOT IN BASELINE: {path}")
+        return 1
+    log(f"{CHANGE_MESSAGES[kind]}: {path} ({how})", level="alert", event=kind, path=path)
+    return 1
+
+
+def cmd_verify(path: str, store_name: str = "auto", paranoid: bool = False) -> None:
+    """Check a single file against the baseline without running a whole check."""
+    store = open_store(store_name)
+    if not store.has_baseline():
+        die("Baseline not found. Run: python fic.py init")
+    base = store.baseline_lookup()(path)
+    opts = HashOptions(algos=store.algos)
+    store.close()
+    if base is not None and paranoid:
+        base = (base[0], None)
+    raise SystemExit(report_verify(path, *verify_path(path, base, opts)))
+
+
+class FicDaemon:
+    """What `fic.py serve` keeps in memory between requests.
+
+    The baseline (digest and stat per path) lives in a dict, so `verify`
+    and the stat cache of `check` never touch the store files. It is
+    reloaded when init/import bump the baseline version in the store state.
+    The compiled list is cached by read_list(). Requests that change
+    anything run one at a time; verify and status don't wait for them.
+    """
+
+    def __init__(self, listfile: Path, store_name: str) -> None:
+        self.listfile = listfile.resolve()
+        self.store_name = store_name
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.baseline = Baseline({})
+        self.requests = 0
+        self.last_check: Optional[str] = None
+        self.reload()
+
+    @property
+    def store(self) -> str:
+        return self.baseline.store
+
+    @property
+    def algos(self) -> Tuple[str, ...]:
+        return self.baseline.algos
+
+    def reload(self) -> None:
+        self.baseline = Baseline.load(self.store_name, required=False)
+        log(f"Daemon loaded {len(self.baseline)} baseline entries ({self.store} store)")
+
+    def refresh(self) -> None:
+        store = open_store(self.store_name)
+        version = store.load_state().get("baseline_version")
+        store.close()
+        if version != self.baseline.version:
+            self.reload()
+
+    def declines(self, req: dict) -> Optional[str]:
+        """Why this request must run in the client instead, or None."""
+        args = req.get("args", {})
+        if args.get("output") or args.get("alert"):
+            return "event output and alerts are sent by the client"
+        store = args.get("store", "auto")
+        if store not in ("auto", self.store):
+            return f"daemon uses the {self.store} store"
+        if req.get("cwd") != os.getcwd() and "listfile" in args:
+            includes, _ = read_list(Path(args["listfile"]))
+            if any(not os.path.isabs(line) for line in includes):
+                return "list has relative paths and the client runs in another directory"
+        return None
+
+    def handle(self, req: dict) -> int:
+        self.requests += 1
+        cmd = req.get("cmd")
+        args = argparse.Namespace(**req.get("args", {}))
+        if cmd == "verify":
+            path = args.path
+            full = path if os.path.isabs(path) else os.path.join(req.get("cwd", ""), path)
+            base = self.baseline.get(path) or self.baseline.get(full)
+            if base is not None and args.paranoid:
+                base = (base[0], None)
+            return report_verify(path, *verify_path(full, base, HashOptions(algos=self.algos)))
+        if cmd == "status":
+            LOGGER.echo(
+                f"fic daemon pid {os.getpid()}, up {time.time() - self.started:.0f}s, {self.requests} requests\n"
+                f"list: {self.listfile}\n"
+                f"store: {self.store} ({'+'.join(self.algos)}), {len(self.baseline)} baseline entries\n"
+                f"last check: {self.last_check or 'none yet'}"
+            )
+            return 0
+        with self.lock:
+            if cmd == "reload":
+                self.reload()
+            elif cmd == "check":
+                self.refresh()
+                cmd_check(
+                    Path(args.listfile),
+                    args.jobs,
+                    args.paranoid,
+                    args.full_every,
+                    self.store,
+                    hash_options(args),
+                    args.resume,
+                    args.rolling,
+                    baseline=self.baseline.get,
+                )
+                self.last_check = ts()
+            elif cmd == "add":
+                cmd_add(args.path, Path(args.listfile))
+            elif cmd == "remove":
+                cmd_remove(args.path, Path(args.listfile))
+            else:
+                die(f"Unknown daemon request: {cmd}")
+        return 0
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """One request per connection: a JSON line in; {"out": line}... then {"exit": code} out."""
+
+    def handle(self) -> None:
+        daemon: FicDaemon = self.server.fic  # type: ignore[attr-defined]
+
+        def send(msg: dict) -> None:
+            self.wfile.write(json.dumps(msg).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+        try:
+            req = json.loads(self.rfile.readline())
+            reason = daemon.declines(req)
+            if reason:
+                send({"fallback": reason})
+                return
+            with LOGGER.echo_to(lambda line: send({"out": line})):
+                try:
+                    code = daemon.handle(req)
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else 1
+                except FicError as e:
+                    log(f"ERROR: {e}", level="error")
+                    code = 1
+                except Exception as e:
+                    log(f"ERROR: {type(e).__name__}: {e}", level="error")
+                    code = 1
+            LOGGER.flush()
+            send({"exit": code})
+        except (OSError, ValueError):
+            pass  # client went away or sent garbage
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def daemon_call(socket_path: Path, cmd: str, args: dict) -> Optional[int]:
+    """Run a command in a running `fic.py serve`.
+
+    Prints the daemon's output and returns its exit code, or None if no
+    daemon is listening or it asked the client to run the command itself.
+    """
+    if not hasattr(socket, "AF_UNIX") or not socket_path.exists():
+        return None
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(str(socket_path))
+    except OSError:
+        return None
+    req = {"cmd": cmd, "args": args, "cwd": os.getcwd()}
+    with sock, sock.makefile("rwb") as f:
+        f.write(json.dumps(req).encode("utf-8") + b"\n")
+        f.flush()
+        for raw in f:
+            msg = json.loads(raw)
+            if "out" in msg:
+                print(msg["out"])
+            elif "exit" in msg:
+                return msg["exit"]
+            elif "fallback" in msg:
+                return None
+    return None  # daemon went away mid-request
+
+
+def cmd_serve(listfile: Path, store_name: str, socket_path: Path) -> None:
+    """Keep list, baseline and stat cache in memory and answer requests on a Unix socket."""
+    if not hasattr(socket, "AF_UNIX"):
+        die("serve needs Unix domain sockets")
+    if not listfile.exists():
+        die(f"List file not found: {listfile}")
+    if socket_path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+            die(f"A daemon is already listening on {socket_path}")
+        except OSError:
+            socket_path.unlink()  # left over from a daemon that was killed
+        finally:
+            probe.close()
+
+    server = DaemonServer(str(socket_path), DaemonHandler)
+    os.chmod(socket_path, 0o600)
+    server.fic = FicDaemon(listfile, store_name)  # type: ignore[attr-defined]
+
+    def stop(signum, frame) -> None:
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    log(f"Serving on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log("Daemon stopped.")
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
+
+def add_hash_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Number of hashing threads")
+    p.add_argument("--mmap", action="store_true", help=f"Hash files over {MMAP_MIN_SIZE >> 20} MiB through mmap")
+    p.add_argument(
+        "--order",
+        choices=("list", "inode", "extent"),
+        default="list",
+        help="Read files in list order (default), inode order or physical extent order (Linux FIEMAP)",
+    )
+    p.add_argument(
+        "--timeout",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="Give up on a file after this long and record TIMEOUT (default: 0 = wait forever)",
+    )
+    p.add_argument("--max-mbps", type=float, default=0, metavar="MB", help="Read at most MB megabytes per second")
+    p.add_argument("--max-iops", type=float, default=0, metavar="N", help="Issue at most N reads per second")
+    p.add_argument(
+        "--fadvise",
+        action="store_true",
+        help="Tell the kernel reads are sequential and drop hashed files from the page cache",
+    )
+
+
+def hash_options(args: argparse.Namespace) -> HashOptions:
+    try:
+        algos = parse_algos(args.algo) if getattr(args, "algo", None) else DEFAULT_ALGOS
+    except ValueError as e:
+        die(str(e))
+    if args.max_mbps < 0 or args.max_iops < 0:
+        die("--max-mbps and --max-iops can't be negative")
+    budget = IOBudget(args.max_mbps, args.max_iops) if args.max_mbps or args.max_iops else None
+    return HashOptions(
+        mmap=args.mmap,
+        algos=algos,
+        budget=budget,
+        fadvise=args.fadvise,
+        dedup=InodeDedup(),
+        order=args.order,
+        timeout=max(0.0, args.timeout),
+    )
+
+
+ALERT_HELP = "Also send changes to http(s)://URL, webhook:URL, syslog[:PATH] or spool:DIR (repeatable)"
 
 
 def build_parser() -> argparse.ArgumentParser:
-    p = argparse.ArgumentParser(prog="fic.py", description="File Integrity Checker (Python, SHA-256)")
+    p = argparse.ArgumentParser(prog="fic.py", description="File Integrity Checker (Python, SHA-256 by default)")
+    p.add_argument("--timings", metavar="FILE", help="Write per-phase wall times as JSON to FILE")
+    p.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default="text",
+        help="Format of logs/fic.log: text lines (default) or JSON lines",
+    )
+    p.add_argument(
+        "--socket",
+        default=str(DEFAULT_SOCKET),
+        help="Unix socket of `serve`; check/add/remove/verify go through a daemon listening there",
+    )
+    p.add_argument("--no-daemon", action="store_true", help="Run locally even if a daemon is running")
+    p.add_argument(
+        "--log-max-bytes",
+        type=int,
+        default=DEFAULT_LOG_MAX_BYTES,
+        metavar="N",
+        help=f"Rotate logs/fic.log at this size, 0 = never (default: {DEFAULT_LOG_MAX_BYTES >> 20} MiB)",
+    )
+    p.add_argument(
+        "--log-max-age",
+        type=float,
+        default=DEFAULT_LOG_MAX_AGE / 86400,
+        metavar="DAYS",
+        help=f"Rotate logs/fic.log when its first line is this old, 0 = never (default: {DEFAULT_LOG_MAX_AGE // 86400})",
+    )
     sub = p.add_subparsers(dest="cmd")
 
     p_init = sub.add_parser("init", help="Create baseline hashes")
     p_init.add_argument("listfile", nargs="?", default=str(DEFAULT_LIST))
+    add_hash_args(p_init)
+    p_init.add_argument(
+        "--algo",
+        default="sha256",
+        help="hashlib algorithm(s), comma separated, e.g. sha256,blake2b (all computed in one read)",
+    )
+    p_init.add_argument("--store", choices=STORES, default="auto", help="Where to keep hashes (default: auto)")
+    p_init.add_argument("--history", action="store_true", help="Keep every scan from now on in db/history/")
 
     p_check = sub.add_parser("check", help="Compare current hashes vs baseline")
     p_check.add_argument("listfile", nargs="?", default=str(DEFAULT_LIST))
+    add_hash_args(p_check)
+    p_check.add_argument("--paranoid", action="store_true", help="Ignore the stat cache and rehash every file")
+    p_check.add_argument(
+        "--full-every",
+        type=int,
+        default=DEFAULT_FULL_EVERY,
+        metavar="N",
+        help=f"Rehash everything on every Nth check, 0 = never (default: {DEFAULT_FULL_EVERY})",
+    )
+    p_check.add_argument("--store", choices=STORES, default="auto", help="Where hashes are kept (default: auto)")
+    p_check.add_argument(
+        "--rolling",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Rehash a different 1/N of the files on every check (all within N checks) "
+        "instead of the --full-every full rehash",
+    )
+    p_check.add_argument(
+        "--output",
+        metavar="ndjson[:PATH|-]",
+        help="Also emit one JSON object per change while scanning, to PATH (appended) or stdout",
+    )
+    p_check.add_argument("--alert", action="append", default=[], metavar="TARGET", help=ALERT_HELP)
+    p_check.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted check from its last checkpoint instead of starting over",
+    )
+
+    p_export = sub.add_parser("export", help="Print baseline/last scan as sha256sum text")
+    p_export.add_argument("kind", nargs="?", choices=("baseline", "scan"), default="baseline")
+    p_export.add_argument("-o", "--output", help="Write to this file instead of stdout")
+    p_export.add_argument("--algo", help="Which digest to write if the baseline has several")
+    p_export.add_argument("--store", choices=STORES, default="auto")
+
+    p_import = sub.add_parser("import", help="Load a sha256sum text file into the store")
+    p_import.add_argument("hashfile")
+    p_import.add_argument("--as", dest="kind", choices=("baseline", "scan"), default="baseline")
+    p_import.add_argument("--algo", help="Algorithm of the file (default: from its suffix, else sha256)")
+    p_import.add_argument("--store", choices=STORES, default="auto")
+
+    p_accept = sub.add_parser("accept", help="Take changes from the last scan into the baseline")
+    p_accept.add_argument("paths", nargs="*", metavar="PATH", help="Files or directories whose changes to accept")
+    p_accept.add_argument("--all-modified", action="store_true", help="Accept every MODIFIED entry")
+    p_accept.add_argument(
+        "--from-last-scan",
+        action="store_true",
+        help="Accept every change (modified, new, missing), i.e. make the baseline equal the last scan",
+    )
+    p_accept.add_argument("--store", choices=STORES, default="auto")
+
+    p_root = sub.add_parser("root", help="Print the Merkle root hash of baseline/last scan")
+    p_root.add_argument("kind", nargs="?", choices=("baseline", "scan"), default="baseline")
+    p_root.add_argument("--store", choices=STORES, default="auto")
+
+    p_diff = sub.add_parser("diff", help="Compare two baselines via their Merkle trees")
+    p_diff.add_argument("a", help="baseline, scan or a sha256sum file")
+    p_diff.add_argument("b", help="baseline, scan or a sha256sum file")
+    p_diff.add_argument("--store", choices=STORES, default="auto")
+
+    p_watch = sub.add_parser("watch", help="Report changes as they happen (Linux inotify)")
+    p_watch.add_argument("listfile", nargs="?", default=str(DEFAULT_LIST))
+    p_watch.add_argument("--store", choices=STORES, default="auto")
+    p_watch.add_argument("--alert", action="append", default=[], metavar="TARGET", help=ALERT_HELP)
+
+    p_log = sub.add_parser("log", help="Print log lines from a time range (current and rotated logs)")
+    p_log.add_argument("--since", help="Start time, YYYY-mm-dd[ HH:MM[:SS]]")
+    p_log.add_argument("--until", help="End time, inclusive (a date covers the whole day)")
+    p_log.add_argument("--path", help="Only lines that mention this path")
+
+    p_history = sub.add_parser("history", help="Scans kept in db/history/, changes of a path, state at a time")
+    p_history.add_argument("path", nargs="?", help="Show when this path changed")
+    p_history.add_argument("--at", metavar="T", help="State at time T, YYYY-mm-dd[ HH:MM[:SS]] (a date means its end)")
+    p_history.add_argument("-o", "--output", help="With --at: write the sha256sum text here instead of stdout")
+
+    p_serve = sub.add_parser("serve", help="Run a daemon that keeps list and baseline in memory")
+    p_serve.add_argument("listfile", nargs="?", default=str(DEFAULT_LIST))
+    p_serve.add_argument("--store", choices=STORES, default="auto")
+
+    p_verify = sub.add_parser("verify", help="Check one file against the baseline")
+    p_verify.add_argument("path")
+    p_verify.add_argument("--paranoid", action="store_true", help="Hash it even if the stat data matches")
+    p_verify.add_argument("--store", choices=STORES, default="auto")
+
+    sub.add_parser("status", help="Show whether a daemon is running and what it holds")
 
     p_add = sub.add_parser("add", help="Add file path to list")
     p_add.add_argument("path")
@@ -242,23 +4007,104 @@ def build_parser() -> argparse.ArgumentParser:
 
 
 def main(argv: list[str] | None = None) -> None:
+    try:
+        run(argv)
+    except FicError as e:
+        die(str(e))
+
+
+def run(argv: list[str] | None = None) -> None:
     DB_DIR.mkdir(parents=True, exist_ok=True)
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
     parser = build_parser()
     args = parser.parse_args(argv)
+    LOGGER.fmt = args.log_format
+    LOGGER.max_bytes = max(0, args.log_max_bytes)
+    LOGGER.max_age = max(0, int(args.log_max_age * 86400))
 
     cmd = args.cmd
     if cmd is None:
         parser.print_help()
         return
 
+    if getattr(args, "jobs", 1) < 1:
+        die("--jobs must be at least 1")
+    if getattr(args, "rolling", 0) < 0:
+        die("--rolling must be at least 1 (or 0 for off)")
+
+    if args.timings:
+        TIMER.enabled = True
+        atexit.register(TIMER.dump, Path(args.timings))
+
+    # With a daemon running, these commands are only a thin client
+    socket_path = Path(args.socket)
+    if cmd in ("check", "add", "remove", "verify", "status") and not args.no_daemon:
+        payload = {k: v for k, v in vars(args).items() if k not in ("socket", "no_daemon", "timings")}
+        if "listfile" in payload:
+            payload["listfile"] = str(Path(payload["listfile"]).resolve())
+        code = daemon_call(socket_path, cmd, payload)
+        if code is not None:
+            raise SystemExit(code)
+
     if cmd == "init":
-        cmd_init(Path(args.listfile))
+        cmd_init(Path(args.listfile), args.jobs, args.store, hash_options(args), args.history)
+        daemon_call(socket_path, "reload", {})
         return
     if cmd == "check":
-        cmd_check(Path(args.listfile))
+        # Events on stdout: keep the human lines out of the stream
+        to_stderr = args.output in ("ndjson", "ndjson:-")
+        with LOGGER.echo_to(lambda line: print(line, file=sys.stderr)) if to_stderr else nullcontext():
+            cmd_check(
+                Path(args.listfile),
+                args.jobs,
+                args.paranoid,
+                args.full_every,
+                args.store,
+                hash_options(args),
+                args.resume,
+                args.rolling,
+                output=args.output,
+                alerts=args.alert,
+            )
+        return
+    if cmd == "export":
+        cmd_export(args.kind, args.output, args.store, args.algo)
+        return
+    if cmd == "import":
+        cmd_import(Path(args.hashfile), args.kind, args.store, args.algo)
+        daemon_call(socket_path, "reload", {})
+        return
+    if cmd == "accept":
+        if not (args.paths or args.all_modified or args.from_last_scan):
+            die("Nothing selected: give PATHs, --all-modified or --from-last-scan")
+        cmd_accept(args.paths, args.all_modified, args.from_last_scan, args.store)
+        daemon_call(socket_path, "reload", {})
+        return
+    if cmd == "root":
+        cmd_root(args.kind, args.store)
+        return
+    if cmd == "diff":
+        cmd_diff(args.a, args.b, args.store)
+        return
+    if cmd == "watch":
+        cmd_watch(Path(args.listfile), args.store, args.alert)
+        return
+    if cmd == "log":
+        cmd_log(args.since, args.until, args.path)
+        return
+    if cmd == "history":
+        cmd_history(args.path, args.at, args.output)
+        return
+    if cmd == "serve":
+        cmd_serve(Path(args.listfile), args.store, socket_path)
+        return
+    if cmd == "verify":
+        cmd_verify(args.path, args.store, args.paranoid)
         return
+    if cmd == "status":
+        print(f"No daemon running on {socket_path}")
+        raise SystemExit(1)
     if cmd == "add":
         cmd_add(args.path, Path(args.listfile))
         return
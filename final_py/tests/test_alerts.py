@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Alert sink tests against local stand-ins (no network, no real syslog).
+
+    python -m unittest discover -s tests
+"""
+from __future__ import annotations
+
+import http.server
+import json
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import fic  # noqa: E402
+
+EVENTS = [("CHANGED", f"/srv/file{i}") for i in range(5)]
+PATHS = [path for _, path in EVENTS]
+
+
+def wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """Answers each POST with the next status in `server.statuses` (200 once they run out)."""
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == "truncated":
+            # Promise more than is sent, then hang up: urlopen raises http.client.IncompleteRead
+            self.send_response(200)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            self.wfile.write(b"short")
+            self.close_connection = True
+            return
+        self.server.posts.append((status, json.loads(body)))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class AlertTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.warnings: List[str] = []
+        for name, value in (("ALERT_MAX_BACKOFF", 0.01), ("ALERT_BATCH_SECONDS", 0.05), ("ALERT_RETRIES", 3)):
+            patcher = mock.patch.object(fic, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(fic, "log", lambda message, level="info", **fields: self.warnings.append(message))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp = tempfile.TemporaryDirectory(prefix="fic_test_")
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def serve(self, statuses: list) -> str:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        server.statuses, server.posts = list(statuses), []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        return f"http://127.0.0.1:{server.server_port}/hook"
+
+    def emit_all(self, sink: fic.AlertSink) -> None:
+        for event in EVENTS:
+            sink.emit(*event)
+        sink.close(timeout=10)
+
+    def test_webhook_retries_until_accepted(self) -> None:
+        sink = fic.open_alert_sink(self.serve([503, 200]))
+        self.emit_all(sink)
+        self.assertEqual([status for status, _ in self.server.posts], [503, 200])
+        payload = self.server.posts[-1][1]
+        self.assertEqual(payload["source"], "fic")
+        self.assertEqual([e["path"] for e in payload["events"]], PATHS)
+        self.assertEqual((sink.sent, sink.failed, sink.dropped), (len(EVENTS), 0, 0))
+        self.assertEqual(self.warnings, [])
+
+    def test_webhook_truncated_response_is_retried(self) -> None:
+        sink = fic.open_alert_sink("webhook:" + self.serve(["truncated", 200]))
+        self.emit_all(sink)
+        self.assertEqual((sink.sent, sink.failed), (len(EVENTS), 0))
+        self.assertFalse(sink.thread.is_alive())
+
+    def test_webhook_unreachable_counts_undelivered(self) -> None:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        sink = fic.open_alert_sink(f"http://127.0.0.1:{port}/hook")
+        self.emit_all(sink)
+        self.assertEqual((sink.sent, sink.failed), (0, len(EVENTS)))
+        self.assertEqual(len(self.warnings), 1)
+        self.assertIn(f"0 sent, {len(EVENTS)} not delivered", self.warnings[0])
+
+    def test_unexpected_error_keeps_worker_alive(self) -> None:
+        class Broken(fic.AlertSink):
+            kind = "broken"
+            calls = 0
+
+            def send(self, batch):
+                Broken.calls += 1
+                if Broken.calls <= fic.ALERT_RETRIES:
+                    raise RuntimeError("boom")
+
+        sink = Broken("nowhere")
+        sink.emit(*EVENTS[0])
+        # The first batch fails every attempt; the worker must survive to send the next one
+        wait_for(lambda: sink.failed)
+        sink.emit(*EVENTS[1])
+        sink.close(timeout=10)
+        self.assertEqual((sink.sent, sink.failed), (1, 1))
+        self.assertIn("1 sent, 1 not delivered (last error: boom)", self.warnings[0])
+
+    def test_full_queue_counts_dropped_and_queued(self) -> None:
+        release = threading.Event()
+
+        class Stuck(fic.AlertSink):
+            kind = "stuck"
+
+            def send(self, batch):
+                release.wait()
+
+        with mock.patch.object(fic, "ALERT_QUEUE", 2):
+            sink = Stuck("nowhere")
+        sink.emit(*EVENTS[0])
+        wait_for(lambda: sink.inflight)
+        for event in EVENTS[1:]:
+            sink.emit(*event)
+        self.assertEqual(sink.dropped, len(EVENTS) - 3)
+        # The worker never finishes: the batch in flight and the queued events are all lost
+        sink.close(timeout=0.1)
+        release.set()
+        self.assertIn(f"0 sent, {len(EVENTS)} not delivered", self.warnings[0])
+
+    def test_syslog_datagrams(self) -> None:
+        path = self.tmp / "log.sock"
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as server:
+            server.bind(str(path))
+            server.settimeout(5)
+            sink = fic.open_alert_sink(f"syslog:{path}")
+            self.emit_all(sink)
+            grams = [server.recv(65536).decode() for _ in EVENTS]
+        self.assertEqual(sink.sent, len(EVENTS))
+        for gram, path in zip(grams, PATHS):
+            self.assertTrue(gram.startswith(f"<{fic.SYSLOG_PRI}>fic["), gram)
+            self.assertEqual(json.loads(gram.split(": ", 1)[1])["path"], path)
+
+    def test_spool_files(self) -> None:
+        spool = self.tmp / "spool"
+        sink = fic.open_alert_sink(f"spool:{spool}")
+        self.emit_all(sink)
+        files = sorted(spool.iterdir())
+        self.assertTrue(files and all(f.suffix == ".ndjson" for f in files), files)
+        lines = [json.loads(line) for f in files for line in f.read_text().splitlines()]
+        self.assertEqual([e["path"] for e in lines], PATHS)
+        self.assertEqual(sink.sent, len(EVENTS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Log rotation tests: several processes logging and rotating one logs/fic.log.
+
+    python -m unittest discover -s tests
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+FINAL_PY = Path(__file__).resolve().parent.parent
+
+WRITER = """
+import sys, fic
+fic.LOGGER.FLUSH_LINES = 1
+fic.LOGGER.max_bytes = 400
+for i in range(int(sys.argv[2])):
+    fic.log(f"writer {sys.argv[1]} line {i}")
+"""
+
+
+class RotationTest(unittest.TestCase):
+    def test_concurrent_rotation_keeps_lines_and_index(self) -> None:
+        writers, lines = 6, 150
+        with tempfile.TemporaryDirectory(prefix="fic_test_") as tmp:
+            app = Path(tmp)
+            shutil.copy2(FINAL_PY / "fic.py", app / "fic.py")
+            (app / "logs").mkdir()
+            procs = [
+                subprocess.Popen([sys.executable, "-c", WRITER, str(w), str(lines)], cwd=app, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                for w in range(writers)
+            ]
+            for proc in procs:
+                _, err = proc.communicate(timeout=120)
+                self.assertEqual(proc.returncode, 0, err.decode())
+
+            logs = app / "logs"
+            segments = sorted(p.name for p in logs.glob("fic.log.*.gz"))
+            index = json.loads((logs / "fic.log.index.json").read_text())
+            self.assertEqual(sorted(seg["file"] for seg in index), segments)
+            self.assertTrue(all(len(name) <= len("fic.log.20260101-000000.99999.gz") for name in segments), segments)
+            self.assertEqual([p.name for p in logs.iterdir() if "rotating" in p.name or p.name.endswith(".tmp")], [])
+
+            text = (logs / "fic.log").read_text() if (logs / "fic.log").exists() else ""
+            text += "".join(gzip.decompress((logs / name).read_bytes()).decode() for name in segments)
+            got = sorted(line.split("] ", 1)[1] for line in text.splitlines())
+            want = sorted(f"writer {w} line {i}" for w in range(writers) for i in range(lines))
+            self.assertEqual(got, want)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""DevicePools deadline tests.
+
+    python -m unittest discover -s tests
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import fic  # noqa: E402
+
+
+class LateFuture(Future):
+    """Finishes just as the first timed wait gives up."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.waits = 0
+
+    def result(self, timeout=None):
+        self.waits += 1
+        if self.waits == 1:
+            self.set_result("late")
+            raise FutureTimeout()
+        return super().result(timeout)
+
+
+class DevicePoolsTest(unittest.TestCase):
+    def run_with_deadline(self, fn) -> list:
+        out: list = []
+        thread = threading.Thread(target=lambda: out.append(fn()), daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive(), "deadlocked")
+        return out
+
+    def test_job_finishing_after_wait_timed_out(self) -> None:
+        pools = fic.DevicePools(1, timeout=0.01)
+        job = fic.Job(0)
+        job.future = LateFuture()
+        job.future.set_running_or_notify_cancel()
+        job.started = time.monotonic() - 1
+        pools._pools[0] = fic.DevicePool(1)
+        self.assertEqual(self.run_with_deadline(lambda: pools.result(job, lambda: "TIMEOUT")), ["late"])
+        self.assertEqual(pools._pools[0].hung, 0)
+
+    def test_hung_job_times_out_and_recovers(self) -> None:
+        release = threading.Event()
+        pools = fic.DevicePools(1, timeout=0.05)
+        job = pools.submit(0, release.wait)
+        self.assertEqual(self.run_with_deadline(lambda: pools.result(job, lambda: "TIMEOUT")), ["TIMEOUT"])
+        self.assertTrue(pools.stalled(0))
+        release.set()
+        job.future.result(5)
+        self.assertFalse(pools.stalled(0))
+        pools.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Directory walking tests on a temporary tree.
+
+    python -m unittest discover -s tests
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest import mock
+
+FINAL_PY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(FINAL_PY))
+import fic  # noqa: E402
+
+BAD_NAME = b"bad\xff.txt"
+
+
+class NotUtf8Test(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory(prefix="fic_test_")
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.tree = self.tmp / "d"
+        self.tree.mkdir()
+        (self.tree / "good.txt").write_text("ok\n")
+        try:
+            with open(os.path.join(os.fsencode(self.tree), BAD_NAME), "wb") as f:
+                f.write(b"x\n")
+        except OSError as e:
+            self.skipTest(f"filesystem refuses non-UTF-8 names: {e}")
+
+    def test_scan_tree_skips_with_warning(self) -> None:
+        warnings: List[str] = []
+        with mock.patch.object(fic, "log", lambda message, level="info", **fields: warnings.append(message)):
+            paths = [entry.path for entry in fic.scan_tree(str(self.tree), -1, lambda path: False)]
+        self.assertEqual(paths, [str(self.tree / "good.txt")])
+        self.assertEqual(len(warnings), 1)
+        self.assertIn(repr(os.path.join(os.fsencode(self.tree), BAD_NAME)), warnings[0])
+
+    def test_init_and_check(self) -> None:
+        app = self.tmp / "app"
+        app.mkdir()
+        shutil.copy2(FINAL_PY / "fic.py", app / "fic.py")
+        (app / "list.txt").write_text(f"{self.tree}/\n")
+        for store in ("text", "sorted", "binary", "sqlite"):
+            with self.subTest(store=store):
+                shutil.rmtree(app / "db", ignore_errors=True)
+                for args in (["init", "--store", store], ["check"]):
+                    run = subprocess.run(
+                        [sys.executable, "fic.py", "--no-daemon", *args, "list.txt"],
+                        cwd=app,
+                        capture_output=True,
+                        text=True,
+                    )
+                    self.assertEqual(run.returncode, 0, run.stdout + run.stderr)
+                    self.assertIn("name is not valid UTF-8", run.stdout)
+                self.assertIn("No changes detected", run.stdout)
+                self.assertEqual([p.name for p in (app / "db").iterdir() if p.name.startswith(".")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
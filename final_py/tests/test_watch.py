@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""`watch` tests: a real inotify watcher in a subprocess on a temporary tree (Linux only).
+
+    python -m unittest discover -s tests
+"""
+from __future__ import annotations
+
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+FINAL_PY = Path(__file__).resolve().parent.parent
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "watch needs Linux inotify")
+class WatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory(prefix="fic_test_")
+        self.addCleanup(tmp.cleanup)
+        self.app = Path(tmp.name)
+        self.data = self.app / "data"
+        (self.data / "sub" / "deep").mkdir(parents=True)
+        (self.data / "sub" / "x.py").write_text("excluded\n")
+        (self.data / "sub" / "deep" / "z.txt").write_text("z\n")
+        shutil.copy2(FINAL_PY / "fic.py", self.app / "fic.py")
+        (self.app / "list.txt").write_text(f"{self.data}/\n!*.py\n")
+        subprocess.run(self.fic("init"), cwd=self.app, check=True, capture_output=True)
+        self.out = (self.app / "out.txt").open("w+")
+        self.addCleanup(self.out.close)
+        self.proc = subprocess.Popen(self.fic("watch"), cwd=self.app, stdout=self.out, stderr=subprocess.STDOUT)
+        self.addCleanup(self.stop)
+        self.wait_for("Watching")
+
+    def fic(self, command: str) -> list:
+        return [sys.executable, "fic.py", "--no-daemon", command, "list.txt"]
+
+    def stop(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGINT)
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+
+    def wait_for(self, text: str, timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.out.seek(0)
+            if text in self.out.read():
+                return
+            time.sleep(0.05)
+        self.out.seek(0)
+        self.fail(f"{text!r} not reported:\n{self.out.read()}")
+
+    def test_file_in_directory_without_watched_files(self) -> None:
+        (self.data / "sub" / "evil.sh").write_text("evil\n")
+        self.wait_for(f"NEW (in list now, not in baseline): {self.data}/sub/evil.sh")
+
+    def test_directory_moved_away(self) -> None:
+        (self.data / "sub").rename(self.app / "moved")
+        self.wait_for(f"MISSING: {self.data}/sub/deep/z.txt")
+
+    def test_directory_moved_in(self) -> None:
+        (self.app / "incoming").mkdir()
+        (self.app / "incoming" / "new.txt").write_text("new\n")
+        (self.app / "incoming").rename(self.data / "incoming")
+        self.wait_for(f"NEW (in list now, not in baseline): {self.data}/incoming/new.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()